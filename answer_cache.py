@@ -0,0 +1,169 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from vector_index import normalize_rows
+
+NEGATIONS = frozenset("not no never none nor neither nothing nobody without cannot".split())
+NUMBER_WORDS = frozenset(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+    "sixteen seventeen eighteen nineteen twenty thirty forty fifty sixty seventy eighty ninety "
+    "hundred thousand million half double twice first second third fourth fifth".split()
+)
+
+
+def normalize_question(question):
+    """Question text up to case, spacing and trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def key_terms(question):
+    """Numbers and negations of a question, which embeddings barely tell apart.
+
+    "12 multiplied by 3" and "by 4", or "are" and "aren't mammals", score above
+    any useful similarity threshold, so cached answers also require these to
+    be identical.
+    """
+    words = re.findall(r"\d+(?:\.\d+)?|[a-z]+(?:'[a-z]+)?", question.lower())
+    numbers = tuple(word for word in words if word[0].isdigit() or word in NUMBER_WORDS)
+    # "aren't", "cannot" and "are not" all count as one "not"
+    negations = tuple(sorted(
+        "not" if word.endswith("n't") or word == "cannot" else word
+        for word in words if word in NEGATIONS or word.endswith("n't")
+    ))
+    return numbers, negations
+
+
+class AnswerCache:
+    """Answers keyed by corpus, route and retrieved chunk ids, matched on query similarity.
+
+    A lookup hits when an entry for the same corpus load and route was generated
+    from the same retrieved chunks and its question embedding is within
+    `threshold` cosine similarity of the new one, so repeats and close
+    paraphrases reuse the answer while questions that merely share context
+    do not. The questions must also have the same numbers and negations
+    (key_terms), and on `exact_routes`, where one fact is asked for and a
+    near miss is a wrong answer, the same normalized text. Entries expire
+    after `ttl` seconds and the least recently used are dropped beyond
+    `max_entries`. Chunk ids are rows of one particular
+    load of a syllabus, so entries are also keyed by its `generation`: an
+    answer finished against a syllabus after it was reloaded is never served
+    for the new one.
+    """
+
+    def __init__(self, max_entries=1000, ttl=24 * 3600, threshold=0.92, exact_routes=("factual",)):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exact_routes = frozenset(exact_routes)
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._matrices = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    def get(self, corpus_key, generation, route, chunk_ids, question, query_embedding):
+        query = normalize_rows(query_embedding)[0]
+        text, terms = normalize_question(question), key_terms(question)
+        bucket_key = (corpus_key, generation, route)
+        now = time.time()
+        with self._lock:
+            ids = self._buckets.get(bucket_key)
+            if ids:
+                matrix = self._bucket_matrix(bucket_key)
+                similarities = matrix @ query
+                for position in np.argsort(-similarities):
+                    if similarities[position] < self.threshold:
+                        break
+                    entry = self._entries[ids[position]]
+                    if entry["expires"] < now:
+                        continue
+                    if entry["chunk_ids"] != tuple(chunk_ids) or entry["terms"] != terms:
+                        continue
+                    if route in self.exact_routes and entry["question"] != text:
+                        continue
+                    self._entries.move_to_end(ids[position])
+                    self.hits += 1
+                    if similarities[position] < 0.9999:
+                        self.semantic_hits += 1
+                    self.saved_seconds += entry["seconds"]
+                    return entry["answer"]
+            self.misses += 1
+            return None
+
+    def put(self, corpus_key, generation, route, chunk_ids, question, query_embedding, answer, seconds):
+        """Store an answer along with how long it took to generate"""
+        bucket_key = (corpus_key, generation, route)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "bucket": bucket_key,
+                "chunk_ids": tuple(chunk_ids),
+                "question": normalize_question(question),
+                "terms": key_terms(question),
+                "embedding": normalize_rows(query_embedding)[0],
+                "answer": answer,
+                "seconds": seconds,
+                "expires": time.time() + self.ttl,
+            }
+            self._buckets.setdefault(bucket_key, []).append(entry_id)
+            self._matrices.pop(bucket_key, None)
+
+            self._drop_expired()
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, corpus_key):
+        """Forget every answer for a corpus, e.g. after its syllabus was reloaded"""
+        with self._lock:
+            for bucket_key in [key for key in self._buckets if key[0] == corpus_key]:
+                for entry_id in self._buckets.pop(bucket_key):
+                    self._entries.pop(entry_id, None)
+                self._matrices.pop(bucket_key, None)
+            self.invalidations += 1
+
+    def _bucket_matrix(self, bucket_key):
+        if bucket_key not in self._matrices:
+            ids = self._buckets[bucket_key]
+            self._matrices[bucket_key] = np.vstack([self._entries[i]["embedding"] for i in ids])
+        return self._matrices[bucket_key]
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        ids = self._buckets[entry["bucket"]]
+        ids.remove(entry_id)
+        if not ids:
+            del self._buckets[entry["bucket"]]
+        self._matrices.pop(entry["bucket"], None)
+
+    def _drop_expired(self):
+        now = time.time()
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry["expires"] < now]
+        for entry_id in expired:
+            self._remove(entry_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,37 +1,63 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import zipfile
 import os
-import fitz
-import requests
 import re
 import time
-import speech_recognition as sr
-try:
-    from sentence_transformers import SentenceTransformer, util
-except ImportError:
-    util = None
-    SentenceTransformer = None
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain_ollama import OllamaLLM
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.prompts import PromptTemplate
-from gtts import gTTS
-import io
+import json
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import base64
+from vector_index import normalize_rows, build_index, load_index, save_index, recall_at_k, sample_queries
+import corpus_cache
+import ingest
+from syllabus_registry import Corpus, SyllabusRegistry
+from chunk_store import ChunkStore
+from ollama_client import OllamaClient, OllamaGate, OllamaOverloaded, OllamaUnavailable
+from answer_cache import AnswerCache, normalize_question
+from summaries import Summarizer, SummaryJobs, SummaryStore, summary_key
+from batcher import MicroBatcher
+from bm25 import BM25Index, reciprocal_rank_fusion
+from context_builder import TokenCounter, build_context, merge_passages
+from transcription import AudioDecodeError, AudioTooLong, Transcriber, TranscriptionError, decode_audio
+from tts import TTS_BACKENDS, AudioCache, SpeechSynthesizer
+from metrics import Metrics
+from query_router import QueryRouter, load_examples
+from warmup import LazyEmbeddings, Warmup
+from single_flight import SharedStream, SingleFlight, StreamAbandoned
+from batch_jobs import BatchJobs
 
 app = Flask(__name__)
 CORS(app)  
 
+# Last selection, used when /api/ask does not name a class and subject
 current_class = None
 current_subject = None
-pdf_chunks = {}  
-all_documents = []  
-chunk_embeddings = None
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Loaded on first use or by the warm-up thread, so importing the app stays fast
+embedding_model = LazyEmbeddings(EMBEDDING_MODEL_NAME)
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "gemma:2b-instruct"
+OLLAMA_ERROR_MESSAGE = "I'm having trouble connecting to the knowledge base right now."
+OLLAMA_BUSY_MESSAGE = "Lots of students are asking right now. Please try again in a few seconds."
+# Generations allowed at once against the local model server, and how many may wait for a slot
+OLLAMA_MAX_IN_FLIGHT = int(os.environ.get("OLLAMA_MAX_IN_FLIGHT", "2"))
+OLLAMA_MAX_QUEUE = int(os.environ.get("OLLAMA_MAX_QUEUE", "16"))
+OLLAMA_QUEUE_TIMEOUT = float(os.environ.get("OLLAMA_QUEUE_TIMEOUT", "30"))
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Load the embedding model, prompt tokenizer and Ollama model in the background at startup
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "1") == "1"
+
+# Repeated and near-duplicate questions reuse earlier answers for the same retrieved chunks
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = 24 * 3600
+ANSWER_CACHE_THRESHOLD = 0.92
+# Identical questions asked while the first is still being answered wait for that answer
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "1") == "1"
 
 AVAILABLE_CLASSES = {
     "Class 3": "class3_books",
@@ -44,146 +70,557 @@ AVAILABLE_SUBJECTS = {
     "EVS": "evs"
 }
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,
-    chunk_overlap=50,
-    length_function=len,
+# "flat" (exact), "ivf", "hnsw" (needs hnswlib) or "int8" (quantized vectors in RAM, float rescoring
+# from disk); "auto" switches to ivf for large syllabi when it reaches ANN_MIN_RECALL
+VECTOR_INDEX = os.environ.get("VECTOR_INDEX", "flat")
+ANN_MIN_CHUNKS = 20000
+# IVF doubles nprobe at build time until recall@10 reaches this, probing at most a quarter of the lists
+ANN_MIN_RECALL = float(os.environ.get("ANN_MIN_RECALL", "0.95"))
+ANN_MAX_PROBE_FRACTION = 0.25
+INDEX_PARAMS = {
+    "flat": {},
+    "ivf": {"nprobe": 16},
+    "hnsw": {"m": 16, "ef_construction": 200, "ef_search": 64},
+    "int8": {"rescore": int(os.environ.get("INT8_RESCORE", "4"))},
+}
+
+# Summaries of whole PDFs are built in the background, on first request or at load time
+SUMMARIZE_ON_LOAD = os.environ.get("SUMMARIZE_ON_LOAD", "0") == "1"
+SUMMARY_DIR = os.path.join(corpus_cache.CACHE_DIR, "summaries")
+
+# Concurrent questions are embedded together: wait up to the window for more, up to the batch size
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "32"))
+
+# CPU-bound retrieval runs on at most one thread per core; model and TTS calls are I/O-bound
+RETRIEVAL_WORKERS = int(os.environ.get("RETRIEVAL_WORKERS", os.cpu_count() or 1))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "64"))
+
+# Dense results are fused with BM25 keyword matches by reciprocal rank, taking this many from each
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") == "1"
+RRF_DEPTH = 50
+GENERAL_TOP_K = 5
+SUMMARY_TOP_K = 10
+# Dense ranking depth that serves every route's search_chunks call
+RETRIEVAL_DEPTH = max(RRF_DEPTH, SUMMARY_TOP_K)
+
+# Retrieved context is packed into at most this many prompt tokens. They are estimated from length
+# unless PROMPT_TOKENIZER names a Hugging Face tokenizer for the model; google/gemma-2b-it is gated,
+# so it needs an authenticated token. Ollama's own count of each prompt is logged either way.
+PROMPT_TOKENIZER = os.environ.get("PROMPT_TOKENIZER") or None
+GENERAL_CONTEXT_TOKENS = int(os.environ.get("GENERAL_CONTEXT_TOKENS", "600"))
+SUMMARY_CONTEXT_TOKENS = int(os.environ.get("SUMMARY_CONTEXT_TOKENS", "1500"))
+
+# Questions are routed by nearest centroid over their embedding; short factual ones get a smaller
+# context and generation budget. ROUTER_EXAMPLES may name a JSONL file of extra labelled examples.
+ROUTER_EXAMPLES = os.environ.get("ROUTER_EXAMPLES")
+FACTUAL_TOP_K = 3
+FACTUAL_CONTEXT_TOKENS = int(os.environ.get("FACTUAL_CONTEXT_TOKENS", "300"))
+ROUTE_NUM_PREDICT = {
+    "factual": int(os.environ.get("FACTUAL_NUM_PREDICT", "150")),
+    "general": int(os.environ.get("GENERAL_NUM_PREDICT", "500")),
+    "summarize": int(os.environ.get("SUMMARIZE_NUM_PREDICT", "1000")),
+    "generate": int(os.environ.get("GENERATE_NUM_PREDICT", "1000")),
+}
+
+# Uploaded voice questions are recognized offline on a process pool: "sphinx", "whisper" or "vosk"
+TRANSCRIBE_ENGINE = os.environ.get("TRANSCRIBE_ENGINE", "sphinx")
+TRANSCRIBE_MODEL = os.environ.get("TRANSCRIBE_MODEL") or None
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "2"))
+MAX_AUDIO_SECONDS = 30
+
+# Spoken answers: "gtts" (online) or "espeak" (offline, needs espeak-ng and ffmpeg), cached per sentence
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "gtts")
+TTS_CACHE_DIR = os.path.join(corpus_cache.CACHE_DIR, "tts")
+TTS_CACHE_MB = int(os.environ.get("TTS_CACHE_MB", "256"))
+
+# Question lists sent to /api/ask/batch, and how many of their generations may run at once
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", OLLAMA_MAX_IN_FLIGHT))
+
+# Approximate RAM allowed for resident syllabi before the least recently used is dropped
+SYLLABUS_MEMORY_BUDGET_MB = int(os.environ.get("SYLLABUS_MEMORY_BUDGET_MB", "1024"))
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+# Anything that changes the chunks or their vectors must be part of the cache key
+CACHE_SETTINGS = {
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "embedding_model": EMBEDDING_MODEL_NAME,
+    "split": "pages",
+}
+
+metrics = Metrics()
+
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+answer_flights = SingleFlight()
+stream_flights = SingleFlight()
+
+prompt_tokens = TokenCounter(PROMPT_TOKENIZER)
+
+ollama_gate = OllamaGate(OLLAMA_MAX_IN_FLIGHT, OLLAMA_MAX_QUEUE, OLLAMA_QUEUE_TIMEOUT)
+ollama_client = OllamaClient(
+    OLLAMA_API_URL,
+    OLLAMA_MODEL,
+    ollama_gate,
+    options={
+        "temperature": 0.1,
+        "top_p": 0.8,
+        "repeat_penalty": 1.1
+    },
+    keep_alive=OLLAMA_KEEP_ALIVE
 )
 
-llm = OllamaLLM(
-    base_url="http://localhost:11434",
-    model=OLLAMA_MODEL,
-    temperature=0.1,
-    top_p=0.8,
-    repeat_penalty=1.1
+query_batcher = MicroBatcher(embedding_model.embed_documents, EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH)
+
+query_router = QueryRouter(embedding_model.embed_documents)
+if ROUTER_EXAMPLES:
+    query_router.add_examples(load_examples(ROUTER_EXAMPLES))
+
+transcriber = Transcriber(TRANSCRIBE_ENGINE, TRANSCRIBE_MODEL, TRANSCRIBE_WORKERS)
+
+retrieval_executor = ThreadPoolExecutor(RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+io_executor = ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="io")
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    """Await a blocking call on one of the worker pools, in the caller's context (for request timings)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, fn, *args, **kwargs))
+
+# Figures from the most recent ingestion, for /api/stats
+last_ingestion = {}
+
+manifest = corpus_cache.Manifest(os.path.join(corpus_cache.CACHE_DIR, "manifest.json"))
+
+summary_store = SummaryStore(SUMMARY_DIR)
+# The background summarizer waits its turn for a model slot rather than failing under load
+summary_jobs = SummaryJobs(
+    Summarizer(
+        lambda prompt, max_tokens: ollama_client.generate(prompt, max_tokens=max_tokens, patient=True)["response"]
+    ),
+    summary_store
 )
 
+speech_synthesizer = SpeechSynthesizer(
+    TTS_BACKENDS[TTS_BACKEND](),
+    AudioCache(TTS_CACHE_DIR, TTS_CACHE_MB * 1024 * 1024),
+    io_executor
+)
+
+def import_libraries():
+    """Import what the first syllabus load and question need (PDF parsing, splitter, prompts)"""
+    import fitz
+    from langchain.prompts import PromptTemplate
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+warmup = Warmup([
+    ("embedding_model", embedding_model.load, True),
+    ("query_router", query_router.centroids, True),
+    ("libraries", import_libraries, True),
+    ("prompt_tokenizer", lambda: prompt_tokens.count("warm up"), False),
+    ("ollama_model", ollama_client.preload, False),
+])
+
 # Helper functions
-def extract_text_from_pdf(pdf_bytes):
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    text = []
-    for page in doc:
-        text.append(page.get_text())
-    return "\n".join(text)
-
-def clean_text(text):
-    text = re.sub(r"[^a-zA-Z0-9\s\.\,\;\:\?\!\-]", " ", text)  
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-def load_syllabus_data(class_folder, subject_filter=None):  
-    global pdf_chunks, all_documents
-    
-    pdf_chunks = {}
-    all_documents = []
+def load_zip(zip_path):
+    """Return (pdf_chunks, embeddings, key, pdf_hashes) for a zip, from the on-disk cache when possible.
+
+    A zip whose size and mtime match the manifest is loaded without hashing
+    it. A changed zip only re-ingests the PDFs whose content changed; the
+    chunks and vectors of the others are reused from its previous entry.
+    """
+    zip_name = os.path.basename(zip_path)
+    record = manifest.get(zip_path)
+    if record is not None and manifest.is_current(zip_path, record, CACHE_SETTINGS):
+        cached = corpus_cache.load_entry(record["key"])
+        if cached is not None:
+            print(f" Loaded {zip_name} from cache")
+            return cached + (record["key"], {pdf["name"]: pdf["sha256"] for pdf in record["pdfs"]})
+    
+    key = corpus_cache.cache_key(zip_path, CACHE_SETTINGS)
+    pdf_hashes = corpus_cache.pdf_hashes(zip_path)
+    cached = corpus_cache.load_entry(key)
+    if cached is not None:
+        print(f" Loaded {zip_name} from cache")
+        zip_chunks, embeddings = cached
+    else:
+        zip_chunks, embeddings = update_zip(zip_path, key, pdf_hashes, record)
+        # Reopen the saved entry so a freshly ingested zip is memory-mapped like a cached one
+        saved = corpus_cache.load_entry(key) if len(embeddings) else None
+        if saved is not None:
+            embeddings = saved[1]
+    
+    manifest.put(zip_path, key, [
+        {"name": name, "sha256": pdf_hashes[name], "chunks": len(chunks)} for name, (chunks, _) in zip_chunks.items()
+    ], CACHE_SETTINGS)
+    if record is not None and record["key"] != key:
+        if not manifest.references(record["key"]):
+            corpus_cache.remove_entry(record["key"])
+        removed = corpus_cache.remove_stale_indexes(manifest)
+        if removed:
+            print(f" Removed {removed} vector indexes built over previous versions of the syllabus")
+    return zip_chunks, embeddings, key, pdf_hashes
+
+def update_zip(zip_path, key, pdf_hashes, record):
+    """Ingest the PDFs of a zip that its previous cache entry does not already cover.
+
+    The previous entry is only reused when it was built with the current settings.
+    """
+    start = time.perf_counter()
+    reusable = {}
+    previous = None
+    if record is not None and manifest.built_with(record, CACHE_SETTINGS):
+        previous = corpus_cache.load_entry(record["key"])
+    if previous is not None:
+        previous_chunks, previous_embeddings = previous
+        offset = 0
+        for pdf in record["pdfs"]:
+            rows = len(previous_chunks[pdf["name"]][0])
+            reusable[pdf["sha256"]] = (previous_chunks[pdf["name"]], previous_embeddings[offset:offset + rows])
+            offset += rows
+    
+    changed = [name for name, digest in pdf_hashes.items() if digest not in reusable]
+    new_chunks, vectors, stats = {}, None, None
+    if changed:
+        new_chunks, vectors, stats = ingest.ingest_zip(
+            zip_path, CHUNK_SIZE, CHUNK_OVERLAP, embed_batch=embedding_model.embed_documents, pdf_names=set(changed)
+        )
+        print(f" Ingested {stats['pdfs']} PDFs, {stats['pages']} pages, {stats['chunks']} chunks "
+              f"in {stats['seconds']:.2f}s ({stats['embed_seconds']:.2f}s embedding, {stats['workers']} workers)")
+        if stats["peak_rss_bytes"] is not None:
+            print(f" Peak memory during ingestion: {stats['peak_rss_bytes'] / 1e6:.0f} MB "
+                  f"({stats['spooled']} PDFs spooled to disk)")
+        metrics.observe("document_embedding", stats["embed_seconds"])
+        for seconds in stats["pdf_seconds"].values():
+            metrics.observe("pdf_extraction", seconds)
+        last_ingestion.update({field: stats[field] for field in ("pdfs", "pages", "chunks", "spooled", "seconds", "peak_rss_bytes")})
+    new_embeddings = normalize_rows(vectors) if vectors is not None and len(vectors) else None
+    
+    zip_chunks = {}
+    parts = []
+    offset = 0
+    for name, digest in pdf_hashes.items():
+        if digest in reusable:
+            zip_chunks[name], rows = reusable[digest]
+            print(f"  {name}: unchanged, reused {len(rows)} chunks")
+        else:
+            zip_chunks[name] = new_chunks[name]
+            count = len(zip_chunks[name][0])
+            rows = new_embeddings[offset:offset + count] if new_embeddings is not None else []
+            offset += count
+            print(f"  {name}: processed {count} chunks in {stats['pdf_seconds'][name]:.2f}s")
+        if len(rows):
+            parts.append(np.asarray(rows, dtype=np.float32))
+    if record is not None:
+        for pdf in record["pdfs"]:
+            if pdf["name"] not in pdf_hashes:
+                print(f"  {pdf['name']}: removed")
+    
+    embeddings = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+    if len(embeddings):
+        corpus_cache.save_entry(key, zip_chunks, embeddings, source=os.path.basename(zip_path))
+    print(f" Updated {os.path.basename(zip_path)}: {len(changed)} of {len(pdf_hashes)} PDFs processed "
+          f"in {time.perf_counter() - start:.2f}s")
+    return zip_chunks, embeddings
+
+def load_vector_index(embeddings, zip_keys, previous=None, previous_rows=None):
+    """Load the persisted index for these zips, building and saving it on first use.
+
+    When the syllabus was loaded before, `previous_rows` maps each row to its
+    row in the previous corpus (-1 for new chunks) and the previous index is
+    patched instead of rebuilt.
+    """
+    kind = VECTOR_INDEX
+    if kind == "auto":
+        kind = "ivf" if embeddings.shape[0] >= ANN_MIN_CHUNKS else "flat"
+    params = INDEX_PARAMS[kind]
+    if kind == "flat":
+        return build_index(embeddings, "flat")
+    
+    path = corpus_cache.index_path(corpus_cache.index_key(zip_keys, kind, params))
+    index = load_index(path, embeddings)
+    if index is not None:
+        print(f" Loaded {kind} index from cache (recall@10 {index.recall or 0:.3f})")
+        return exact_if_inaccurate(index, embeddings)
+    
+    start = time.time()
+    if previous is not None and previous.index.kind == kind and hasattr(previous.index, "patched"):
+        index = previous.index.patched(embeddings, previous_rows)
+        action = "Patched"
+    else:
+        index = build_index(embeddings, kind, **params)
+        action = "Built"
+    queries = sample_queries(embeddings)
+    index.recall = recall_at_k(index, embeddings, queries, k=10)
+    if kind == "ivf":
+        tune_nprobe(index, embeddings, queries)
+    print(f" {action} {kind} index over {embeddings.shape[0]} chunks in {time.time() - start:.2f}s, "
+          f"recall@10 vs exact search: {index.recall:.3f}")
+    save_index(index, path, {"zips": list(zip_keys)})
+    if not getattr(index, "scans_vectors", True):
+        print(f" {index.nbytes / 1e6:.1f} MB of quantized vectors in RAM instead of {embeddings.nbytes / 1e6:.1f} MB")
+        # Reopen so the float vectors used for rescoring are memory-mapped rather than held
+        index = load_index(path, embeddings) or index
+    return exact_if_inaccurate(index, embeddings)
+
+def tune_nprobe(index, embeddings, queries):
+    """Double an IVF index's nprobe until its recall@10 reaches ANN_MIN_RECALL.
+
+    Stops at ANN_MAX_PROBE_FRACTION of the lists, beyond which exact search
+    is about as fast.
+    """
+    max_probe = max(1, int(index.centroids.shape[0] * ANN_MAX_PROBE_FRACTION))
+    while index.recall < ANN_MIN_RECALL and index.nprobe < max_probe:
+        index.nprobe = min(index.nprobe * 2, max_probe)
+        index.recall = recall_at_k(index, embeddings, queries, k=10)
+        print(f" nprobe {index.nprobe}: recall@10 {index.recall:.3f}")
+
+def exact_if_inaccurate(index, embeddings):
+    """The index, or exact search when "auto" picked an index below ANN_MIN_RECALL"""
+    if (index.recall or 0) >= ANN_MIN_RECALL:
+        return index
+    if VECTOR_INDEX == "auto":
+        print(f" {index.kind} recall@10 {index.recall or 0:.3f} is below {ANN_MIN_RECALL}, using exact search")
+        return build_index(embeddings, "flat")
+    print(f" Warning: {index.kind} recall@10 {index.recall or 0:.3f} is below {ANN_MIN_RECALL}")
+    return index
+
+def find_syllabus_zips(class_folder, subject_filter=None):
+    """Paths of the zips making up a syllabus, in load order"""
+    books_path = os.path.join("datasets", class_folder)
+    zip_paths = []
+    for zip_file in sorted(os.listdir(books_path)):
+        if zip_file.endswith(".zip"):
+            if subject_filter and subject_filter.lower() not in zip_file.lower():
+                continue
+            zip_paths.append(os.path.join(books_path, zip_file))
+    return zip_paths
+
+def zip_stats(zip_paths):
+    stats = {}
+    for zip_path in zip_paths:
+        stat = os.stat(zip_path)
+        stats[zip_path] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+def syllabus_changed(corpus):
+    """True when zips of a loaded syllabus were added, removed or modified"""
+    class_folder, subject_filter = corpus.key
+    try:
+        return zip_stats(find_syllabus_zips(class_folder, subject_filter)) != corpus.sources
+    except OSError:
+        return True
+
+def load_syllabus_data(class_folder, subject_filter=None, previous=None):  
+    """Build a Corpus for a class folder, or return None when nothing was found.
+
+    `previous` is the syllabus as loaded before, whose index is patched for
+    the chunks that changed rather than rebuilt.
+    """
+    # (pdf_name, chunk texts, chunk pages) in row order; packed into a ChunkStore once all zips are read
+    pdf_chunks = []
+    summary_keys = {}
+    pdf_hashes = {}
     books_path = os.path.join("datasets", class_folder)
     
     if not os.path.exists(books_path):
         print(f"Path does not exist: {books_path}")
-        return False
+        return None
     
     print(f"Loading data from: {books_path}")
     
-    for zip_file in os.listdir(books_path):
-        if zip_file.endswith(".zip"):
-            if subject_filter:
-                subject_key = subject_filter.lower()
-                zip_subject = zip_file.lower()
-                if subject_key not in zip_subject:
-                    continue
-            
-            zip_path = os.path.join(books_path, zip_file)
-            print(f"Processing: {zip_file}")
-            
-            try:
-                with zipfile.ZipFile(zip_path, "r") as zf:
-                    for pdf_name in zf.namelist():
-                        if pdf_name.endswith(".pdf"):
-                            with zf.open(pdf_name) as pdf_file:
-                                pdf_bytes = pdf_file.read()
-                                text = extract_text_from_pdf(pdf_bytes)  
-                                text = clean_text(text)  
-                                
-                                documents = text_splitter.split_text(text)
-                                for i, doc_text in enumerate(documents):
-                                    metadata = {"source": pdf_name, "chunk": i}
-                                    all_documents.append(Document(page_content=doc_text, metadata=metadata))
-                                
-                                pdf_chunks[pdf_name] = documents
-                print(f" Processed {zip_file}")
-            except Exception as e:
-                print(f" Error processing {zip_file}: {e}")
-    
-    print(f"Total PDFs loaded: {len(pdf_chunks)}")
-    print(f"Total chunks collected: {len(all_documents)}")
-    
-    if all_documents:
-        print("Data loaded successfully for LangChain processing!")
-        return True
+    start = time.perf_counter()
+    embedding_parts = []
+    zip_keys = []
+    zip_paths = find_syllabus_zips(class_folder, subject_filter)
+    sources = zip_stats(zip_paths)
+    for zip_path in zip_paths:
+        zip_file = os.path.basename(zip_path)
+        print(f"Processing: {zip_file}")
+        
+        try:
+            zip_chunks, embeddings, zip_key, zip_pdf_hashes = load_zip(zip_path)
+            for pdf_name, (texts, pages) in zip_chunks.items():
+                pdf_chunks.append((pdf_name, texts, pages))
+                pdf_hashes[pdf_name] = zip_pdf_hashes[pdf_name]
+                summary_keys[pdf_name] = summary_key(pdf_hashes[pdf_name], pdf_name, OLLAMA_MODEL, CACHE_SETTINGS)
+            if len(embeddings):
+                embedding_parts.append(embeddings)
+                zip_keys.append(zip_key)
+            print(f" Processed {zip_file}")
+        except Exception as e:
+            print(f" Error processing {zip_file}: {e}")
+    
+    chunks = ChunkStore.build(pdf_chunks)
+    print(f"Total PDFs loaded: {len(pdf_hashes)}")
+    print(f"Total chunks collected: {len(chunks)} ({chunks.nbytes / 1e6:.1f} MB of text)")
+    
+    if len(chunks):
+        # A single cached zip stays memory-mapped; several are stacked into RAM
+        if len(embedding_parts) == 1:
+            chunk_embeddings = embedding_parts[0]
+        else:
+            chunk_embeddings = np.vstack(embedding_parts)
+        previous_rows = None
+        if previous is not None:
+            previous_rows = np.full(len(chunks), -1, dtype=np.int64)
+            previous_by_hash = {digest: name for name, digest in previous.pdf_hashes.items()}
+            for pdf_name, (first, last) in chunks.pdf_rows.items():
+                old_name = previous_by_hash.get(pdf_hashes[pdf_name])
+                if old_name is not None:
+                    old_first, old_last = previous.pdf_rows[old_name]
+                    if old_last - old_first == last - first:
+                        previous_rows[first:last] = np.arange(old_first, old_last)
+        index = load_vector_index(chunk_embeddings, zip_keys, previous, previous_rows)
+        if not getattr(index, "scans_vectors", True):
+            # The stacked float copy is released; the index reads rows from its memory-mapped vectors
+            chunk_embeddings = index.vectors
+        lexical_start = time.time()
+        lexical_index = BM25Index.build(chunks)
+        print(f" Built BM25 index ({len(lexical_index.vocabulary)} terms) in {time.time() - lexical_start:.2f}s")
+        corpus = Corpus((class_folder, subject_filter), chunks, chunk_embeddings, index, lexical_index)
+        corpus.summary_keys = summary_keys
+        corpus.pdf_hashes = pdf_hashes
+        corpus.sources = sources
+        if SUMMARIZE_ON_LOAD:
+            for pdf_name in chunks.pdf_rows:
+                get_pdf_summary(corpus, pdf_name)
+        print(f"Data loaded successfully for LangChain processing in {time.perf_counter() - start:.2f}s!")
+        return corpus
     else:
         print(" No syllabus content found.")
-        return False
+        return None
 
-def retrieve_context(query, k=3):
-    if not all_documents:
-        return "No context available", None
+def load_corpus(class_name, subject, previous=None):
+    if class_name not in AVAILABLE_CLASSES:
+        return None
+    with metrics.timer("syllabus_load"):
+        corpus = load_syllabus_data(AVAILABLE_CLASSES[class_name], subject, previous)
+    if corpus is not None:
+        # Answers from a previous load no longer match the chunks; ones still being generated
+        # against it are stored under its generation, which the new corpus never looks up
+        answer_cache.invalidate(corpus.key)
+    return corpus
+
+syllabus_registry = SyllabusRegistry(load_corpus, SYLLABUS_MEMORY_BUDGET_MB * 1024 * 1024, syllabus_changed)
+
+def search_chunks(corpus, query, query_embedding, k, hybrid=None, dense=None):
+    """Indices of the k best chunks: dense cosine, fused with BM25 by reciprocal rank when hybrid.
+
+    `dense` is the question's dense ranking when it was already searched (in
+    a batch), at least RETRIEVAL_DEPTH deep.
+    """
+    if hybrid is None:
+        hybrid = HYBRID_RETRIEVAL
+    if not hybrid or corpus.lexical_index is None:
+        if dense is not None:
+            return [int(idx) for idx in dense[:k]]
+        indices, _ = corpus.index.search(query_embedding, k)
+        return [int(idx) for idx in indices]
     
-    document_texts = [doc.page_content for doc in all_documents]
+    depth = max(k, RRF_DEPTH)
+    if dense is not None:
+        dense = dense[:depth]
+    else:
+        dense, _ = corpus.index.search(query_embedding, depth)
+    lexical, _ = corpus.lexical_index.search(query, depth)
+    return reciprocal_rank_fusion([dense, lexical], k)
+
+def retrieve_context(corpus, query, k=3, query_embedding=None, token_budget=None, dense=None):
+    """Return (context, pdf_names, chunk_ids) for the k chunks closest to the query.
+
+    Adjacent chunks of a PDF are merged without their overlap; with a
+    token_budget, lower-ranked chunks that no longer fit are left out.
+    """
+    if corpus is None or not len(corpus.chunks):
+        return "No context available", None, []
     
-    query_embedding = embedding_model.embed_query(query)
-    document_embeddings = embedding_model.embed_documents(document_texts)
+    if query_embedding is None:
+        with metrics.timer("query_embedding"):
+            query_embedding = query_batcher.embed(query)
+    with metrics.timer("search"):
+        top_k_indices = search_chunks(corpus, query, query_embedding, k, dense=dense)
     
-    if util:
-        similarities = util.pytorch_cos_sim([query_embedding], document_embeddings)[0]
-        top_k_indices = similarities.topk(k).indices.tolist()
-    else:
-        from numpy import dot
-        from numpy.linalg import norm
-        similarities = []
-        for doc_embedding in document_embeddings:
-            cos_sim = dot(query_embedding, doc_embedding) / (norm(query_embedding) * norm(doc_embedding))
-            similarities.append(cos_sim)
-        
-        import numpy as np
-        top_k_indices = np.argsort(similarities)[-k:][::-1].tolist()
-    
-    pdf_names = set()
-    top_chunks = []
-    for idx in top_k_indices:
-        chunk_text = all_documents[idx].page_content
-        top_chunks.append(chunk_text)
-        pdf_names.add(all_documents[idx].metadata["source"])
-    
-    return "\n".join(top_chunks), list(pdf_names)
-
-def query_ollama(prompt, max_tokens=500):
-    payload = {
-        "model": OLLAMA_MODEL,
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.1,
-            "num_predict": max_tokens,
-            "top_p": 0.8,
-            "repeat_penalty": 1.1
-        }
-    }
+    chunks = [corpus.chunks.chunk(idx) for idx in top_k_indices]
     
-    try:
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=60)
-        response.raise_for_status()
-        return response.json()["response"]
-    except requests.exceptions.RequestException:
-        return "I'm having trouble connecting to the knowledge base right now."
+    with metrics.timer("context_build"):
+        context, used, _ = build_context(chunks, token_budget or float("inf"), prompt_tokens, CHUNK_OVERLAP)
+    pdf_names = {chunks[position][0] for position in used}
+    return context, list(pdf_names), [top_k_indices[position] for position in used]
+
+def get_pdf_summary(corpus, pdf_name):
+    """Precomputed summary of a PDF, or None while it is queued for the background job"""
+    key = corpus.summary_keys[pdf_name]
+    summary = summary_store.get(key)
+    if summary is None:
+        summary_jobs.schedule(key, pdf_name, lambda: corpus.chunks.pdf_texts(pdf_name))
+    return summary
+
+def summarized_context(corpus, chunk_ids):
+    """Section summaries covering the retrieved chunks, falling back to raw chunk text"""
+    parts = []
+    raw_chunks = []
+    seen_sections = set()
+    for idx in chunk_ids:
+        source, number = corpus.chunks.source(idx), int(corpus.chunks.chunk_numbers[idx])
+        summary = get_pdf_summary(corpus, source)
+        if summary is None:
+            raw_chunks.append(corpus.chunks.chunk(idx))
+            continue
+        for position, section in enumerate(summary["sections"]):
+            start, end = section["chunks"]
+            if start <= number < end:
+                if (source, position) not in seen_sections:
+                    seen_sections.add((source, position))
+                    parts.append(section["summary"])
+                break
+    parts.extend(passage[2] for passage in merge_passages(raw_chunks, CHUNK_OVERLAP))
+    return "\n".join(parts)
+
+def prompt_plan(route, prompt, max_tokens, chunk_ids):
+    """Request for generate_answer, with the prompt's size logged"""
+    tokens = prompt_tokens.count(prompt)
+    print(f"{route.capitalize()} prompt: {tokens} tokens")
+    return {"route": route, "prompt": prompt, "max_tokens": max_tokens, "chunk_ids": chunk_ids, "prompt_tokens": tokens}
+
+def record_ollama_timings(plan, response):
+    """Log and record Ollama's own load/prefill/generation timings and token counts"""
+    if not response:
+        return
+    for field, stage in (("load_duration", "ollama_load"), ("prompt_eval_duration", "ollama_prompt_eval"),
+                         ("eval_duration", "ollama_eval")):
+        if field in response:
+            metrics.observe(stage, response[field] / 1e9)
+    for field, counter in (("prompt_eval_count", "ollama_prompt_tokens_total"), ("eval_count", "ollama_generated_tokens_total")):
+        if field in response:
+            metrics.count(counter, response[field])
+            metrics.note(field, response[field])
+    if "prompt_eval_count" in response:
+        print(
+            f"Ollama prompt eval: {response['prompt_eval_count']} tokens "
+            f"(budgeted as {plan['prompt_tokens']}) in {response.get('prompt_eval_duration', 0) / 1e6:.0f} ms"
+        )
 
-def answer_general_question(query):
-    """Answer general questions using the entire syllabus"""
-    context, _ = retrieve_context(query, k=5)
+def build_general_prompt(corpus, query, query_embedding=None, route="general", dense=None):
+    """Prompt for general questions using the entire syllabus; the "factual" route asks for a short answer"""
+    if route == "factual":
+        k, token_budget = FACTUAL_TOP_K, FACTUAL_CONTEXT_TOKENS
+        length = "Answer in one or two short sentences in simple words suitable for students."
+    else:
+        k, token_budget = GENERAL_TOP_K, GENERAL_CONTEXT_TOKENS
+        length = "Keep your answer concise and in simple words suitable for students."
+    context, _, chunk_ids = retrieve_context(
+        corpus, query, k=k, query_embedding=query_embedding, token_budget=token_budget, dense=dense
+    )
     
+    from langchain.prompts import PromptTemplate
     prompt_template = PromptTemplate(
         input_variables=["context", "question"],
         template="""You are a helpful teacher for students. Answer the question based on the provided context.
-        Use the information from the context. Keep your answer concise and in simple words suitable for students.
+        Use the information from the context. """ + length + """
         
         Context: {context}
         
@@ -192,20 +629,40 @@ def answer_general_question(query):
         Answer:"""
     )
     
-    prompt = prompt_template.format(context=context, question=query)
-    return query_ollama(prompt)
+    with metrics.timer("prompt_format"):
+        prompt = prompt_template.format(context=context, question=query)
+        return prompt_plan(route, prompt, ROUTE_NUM_PREDICT[route], chunk_ids)
+
+def build_summarize_prompt(corpus, query, pdf_name=None, query_embedding=None, summary_only=False, route="summarize", dense=None):
+    """Prompt for summarize/generate questions with more comprehensive approach.
 
-def answer_summarize_question(query, pdf_name=None):
-    """Answer summarize/generate questions with more comprehensive approach"""
+    Uses the precomputed PDF summaries when they exist; a plain summary request
+    for a whole PDF is answered with its document summary directly.
+    """
     if pdf_name:
-        if pdf_name not in pdf_chunks:
-            return f"PDF '{pdf_name}' not found in the loaded syllabus."
+        if pdf_name not in corpus.pdf_rows:
+            return {"answer": f"PDF '{pdf_name}' not found in the loaded syllabus."}
         
-        content = " ".join(pdf_chunks[pdf_name])
+        summary = get_pdf_summary(corpus, pdf_name)
+        if summary is None:
+            chunks = [(pdf_name, i, text) for i, text in enumerate(corpus.chunks.pdf_texts(pdf_name))]
+            content = merge_passages(chunks, CHUNK_OVERLAP)[0][2] if chunks else ""
+        elif summary_only:
+            return {"answer": summary["document"]}
+        else:
+            sections = "\n".join(section["summary"] for section in summary["sections"])
+            content = f"{summary['document']}\n\n{sections}"
+        chunk_ids = [pdf_name]
     else:
-        context, pdf_names = retrieve_context(query, k=10)
-        content = context
+        # Only the ids are needed: summarized_context builds its own content from them
+        if query_embedding is None:
+            with metrics.timer("query_embedding"):
+                query_embedding = query_batcher.embed(query)
+        with metrics.timer("search"):
+            chunk_ids = search_chunks(corpus, query, query_embedding, SUMMARY_TOP_K, dense=dense)
+        content = summarized_context(corpus, chunk_ids)
     
+    from langchain.prompts import PromptTemplate
     prompt_template = PromptTemplate(
         input_variables=["content", "question"],
         template="""You are an expert teacher. Analyze the provided content and create a comprehensive response.
@@ -219,62 +676,250 @@ def answer_summarize_question(query, pdf_name=None):
         Comprehensive response:"""
     )
     
-    prompt = prompt_template.format(content=content[:6000], question=query)
-    return query_ollama(prompt, max_tokens=1000)
+    with metrics.timer("prompt_format"):
+        content = prompt_tokens.truncate(content, SUMMARY_CONTEXT_TOKENS)
+        prompt = prompt_template.format(content=content, question=query)
+        return prompt_plan(route, prompt, ROUTE_NUM_PREDICT[route], chunk_ids)
 
-def hybrid_answer_question(query):
-    """Determine the type of question and use appropriate method"""
-    query_lower = query.lower()
-    
-    summary_keywords = ['summarize', 'summary', 'overview', 'brief', 'recap']
-    generate_keywords = ['generate', 'create', 'make', 'write', 'compose', 'develop']
-    specific_keywords = ['chapter', 'lesson', 'unit', 'section']
+def prepare_answer(corpus, query, query_embedding=None, dense=None):
+    """Route the question by intent and build the request for that route.
+
+    Returns a dict with the route, prompt, max_tokens, retrieved chunk_ids and
+    query_embedding, or with a ready `answer` when no generation is needed.
+    `dense` is a dense ranking already computed for the question (see search_chunks).
+    """
+    if query_embedding is None:
+        with metrics.timer("query_embedding"):
+            query_embedding = query_batcher.embed(query)
     
-    is_summary = any(kw in query_lower for kw in summary_keywords)
-    is_generate = any(kw in query_lower for kw in generate_keywords)
-    is_specific = any(kw in query_lower for kw in specific_keywords)
-    has_pdf = re.search(r'\.pdf', query_lower)
+    with metrics.timer("routing"):
+        route = query_router.route(query_embedding)
+    if route not in ROUTE_NUM_PREDICT:
+        route = "general"
+    metrics.count(f"route_{route}_total")
+    metrics.note("route", route)
     
-    if is_summary or is_generate or is_specific:
+    if route in ("summarize", "generate"):
         pdf_match = re.search(r'(\w+\.pdf)', query, re.IGNORECASE)
         pdf_name = pdf_match.group(1) if pdf_match else None
-        return answer_summarize_question(query, pdf_name)
+        plan = build_summarize_prompt(corpus, query, pdf_name, query_embedding, summary_only=route == "summarize", route=route, dense=dense)
+    else:
+        plan = build_general_prompt(corpus, query, query_embedding, route, dense)
+    plan["query"] = query
+    plan["query_embedding"] = query_embedding
+    plan["sources"] = cite_pages(corpus, plan.get("chunk_ids", []))
+    return plan
+
+def cite_pages(corpus, chunk_ids):
+    """[{"pdf": name, "pages": [...]}] for the chunks an answer was built from, PDFs in retrieval order"""
+    sources = {}
+    for idx in chunk_ids:
+        if isinstance(idx, str):
+            # A whole PDF, for summaries of a named PDF
+            sources.setdefault(idx, set())
+            continue
+        pages = sources.setdefault(corpus.chunks.source(idx), set())
+        page = corpus.chunks.page(idx)
+        if page is not None:
+            pages.add(page)
+    return [{"pdf": pdf_name, "pages": sorted(pages)} for pdf_name, pages in sources.items()]
+
+def cached_answer(corpus, plan):
+    return answer_cache.get(
+        corpus.key, corpus.generation, plan["route"], plan["chunk_ids"], plan["query"], plan["query_embedding"]
+    )
+
+def remember_answer(corpus, plan, answer, seconds):
+    answer_cache.put(
+        corpus.key, corpus.generation, plan["route"], plan["chunk_ids"], plan["query"], plan["query_embedding"],
+        answer, seconds
+    )
+
+def generate_answer(corpus, plan):
+    """Answer a prepared question; raises OllamaOverloaded / OllamaUnavailable"""
+    if "answer" in plan:
+        return plan["answer"]
     
-    return answer_general_question(query)
+    answer = cached_answer(corpus, plan)
+    if answer is not None:
+        return answer
+    
+    start = time.perf_counter()
+    with metrics.timer("ollama"):
+        response = ollama_client.generate(plan["prompt"], max_tokens=plan["max_tokens"])
+    record_ollama_timings(plan, response)
+    answer = response["response"]
+    remember_answer(corpus, plan, answer, time.perf_counter() - start)
+    return answer
+
+def hybrid_answer_question(corpus, query):
+    return generate_answer(corpus, prepare_answer(corpus, query))
 
-def get_voice_input():
-    recognizer = sr.Recognizer()
+async def answer_question_async(corpus, query):
+    """(answer, sources): batched query embedding, retrieval on the retrieval pool, then generation on the I/O pool"""
+    with metrics.timer("query_embedding"):
+        query_embedding = await asyncio.wrap_future(query_batcher.submit(query))
+    plan = await run_blocking(retrieval_executor, prepare_answer, corpus, query, query_embedding)
+    answer = await run_blocking(io_executor, generate_answer, corpus, plan)
+    return answer, plan["sources"]
+
+def stream_answer_question(corpus, query):
+    """(iterable of answer tokens, sources); overload and connection errors are raised before the first token"""
+    with metrics.timer("query_embedding"):
+        query_embedding = query_batcher.embed(query)
+    context = contextvars.copy_context()
+    plan = retrieval_executor.submit(context.run, prepare_answer, corpus, query, query_embedding).result()
+    if "answer" in plan:
+        return [plan["answer"]], plan["sources"]
+    
+    answer = cached_answer(corpus, plan)
+    if answer is not None:
+        return [answer], plan["sources"]
+    
+    start = time.perf_counter()
+    tokens = ollama_client.stream(plan["prompt"], max_tokens=plan["max_tokens"])
     
+    def cache_when_complete():
+        collected = []
+        try:
+            for token in tokens:
+                collected.append(token)
+                yield token
+            if tokens.final is not None:
+                metrics.observe("ollama", time.perf_counter() - start)
+                record_ollama_timings(plan, tokens.final)
+                remember_answer(corpus, plan, "".join(collected), time.perf_counter() - start)
+        finally:
+            tokens.close()
     
+    return cache_when_complete(), plan["sources"]
+
+def coalesce_key(corpus, query):
+    """Same syllabus load and same question up to case, spacing and trailing punctuation"""
+    return corpus.key, id(corpus), normalize_question(query)
+
+async def coalesced_answer(corpus, query):
+    """answer_question_async, shared with identical questions already in flight"""
+    if not COALESCE_REQUESTS:
+        return await answer_question_async(corpus, query)
+    key = coalesce_key(corpus, query)
+    future, leader = answer_flights.join(key)
+    if not leader:
+        metrics.count("coalesced_requests_total")
+        metrics.note("coalesced", True)
+        return await asyncio.wrap_future(future)
     try:
-        with sr.Microphone() as source:
-            print("Adjusting for ambient noise...")
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-            print("Listening... Please speak your question now")
-            
-            audio = recognizer.listen(source, timeout=10, phrase_time_limit=5)
-            print("Processing your speech...")
-            
-            try:
-                query = recognizer.recognize_google(audio)
-                print(f"Google recognition: {query}")
-                return query
-            except sr.UnknownValueError:
-                try:
-                    query = recognizer.recognize_sphinx(audio)
-                    print(f"Sphinx recognition: {query}")
-                    return query
-                except sr.UnknownValueError:
-                    return "Sorry, I couldn't understand what you said. Please try again."
-            except sr.RequestError as e:
-                return f"Speech recognition service error: {e}"
-                
-    except sr.WaitTimeoutError:
-        return "No speech detected. Please try again and speak clearly into your microphone."
-    except OSError as e:
-        return f"Microphone error: {e}. Please check your microphone connection."
-    except Exception as e:
-        return f"Error: {str(e)}"
+        result = await answer_question_async(corpus, query)
+    except BaseException as e:
+        answer_flights.resolve(key, future, error=e)
+        raise
+    answer_flights.resolve(key, future, result)
+    return result
+
+def coalesced_stream(corpus, query):
+    """stream_answer_question, attaching to the token stream of an identical question already in flight"""
+    if not COALESCE_REQUESTS:
+        return stream_answer_question(corpus, query)
+    key = coalesce_key(corpus, query)
+    future, leader = stream_flights.join(key)
+    if not leader:
+        metrics.count("coalesced_requests_total")
+        metrics.note("coalesced", True)
+        tokens, sources = future.result()
+        return (tokens.reader() if isinstance(tokens, SharedStream) else tokens), sources
+    try:
+        tokens, sources = stream_answer_question(corpus, query)
+    except BaseException as e:
+        stream_flights.resolve(key, future, error=e)
+        raise
+    if isinstance(tokens, list):
+        stream_flights.resolve(key, future, (tokens, sources))
+        return tokens, sources
+    # Later identical questions can join until the last token, replaying what they missed
+    shared = SharedStream(tokens, on_close=lambda: stream_flights.forget(key, future))
+    stream_flights.resolve(key, future, (shared, sources), keep=True)
+    return shared.reader(), sources
+
+def prepare_batch(corpus, questions):
+    """Plans for several questions from one embedding call and one dense search over all of them"""
+    with metrics.timer("query_embedding"):
+        embeddings = normalize_rows(embedding_model.embed_documents(questions))
+    with metrics.timer("search"):
+        rankings = corpus.index.search_batch(embeddings, RETRIEVAL_DEPTH)
+    return [
+        prepare_answer(corpus, question, embedding, dense)
+        for question, embedding, (dense, _) in zip(questions, embeddings, rankings)
+    ]
+
+def answer_batch(job, corpus):
+    """Answer a batch job's questions, with at most BATCH_CONCURRENCY generations at once.
+
+    Repeated questions are answered once. Results are added to the job as
+    each generation completes.
+    """
+    groups = {}
+    for index, question in enumerate(job.questions):
+        groups.setdefault(coalesce_key(corpus, question), []).append(index)
+    groups = list(groups.values())
+    questions = [job.questions[indices[0]] for indices in groups]
+    plans = retrieval_executor.submit(prepare_batch, corpus, questions).result()
+    slots = threading.BoundedSemaphore(BATCH_CONCURRENCY)
+    
+    def answer(indices, plan):
+        try:
+            result = {"answer": generate_answer(corpus, plan), "sources": plan["sources"]}
+        except OllamaOverloaded:
+            result = {"answer": OLLAMA_BUSY_MESSAGE, "error": "overloaded"}
+        except Exception as e:
+            print(f"Batch question failed: {e}")
+            result = {"answer": OLLAMA_ERROR_MESSAGE, "error": "unavailable"}
+        finally:
+            slots.release()
+        for index in indices:
+            job.add({"index": index, "question": job.questions[index], **result})
+    
+    futures = []
+    for indices, plan in zip(groups, plans):
+        slots.acquire()
+        futures.append(io_executor.submit(answer, indices, plan))
+    for future in futures:
+        future.result()
+    print(f"Answered a batch of {len(job.questions)} questions ({len(groups)} distinct) "
+          f"in {time.time() - job.started:.1f}s")
+
+batch_jobs = BatchJobs(answer_batch)
+
+def ollama_error_response(error, extra=None):
+    """503 with Retry-After when the model is saturated, 502 when it is unreachable"""
+    if isinstance(error, OllamaOverloaded):
+        response = jsonify({"answer": OLLAMA_BUSY_MESSAGE, "error": "overloaded", **(extra or {})})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    print(f"Ollama error: {error}")
+    response = jsonify({"answer": OLLAMA_ERROR_MESSAGE, "error": "unavailable", **(extra or {})})
+    response.status_code = 502
+    return response
+
+def resolve_syllabus(class_name, subject):
+    """(class, subject) as listed in AVAILABLE_CLASSES / AVAILABLE_SUBJECTS, or None when either is unknown.
+
+    Names match ignoring case and spacing, so "maths " and "Maths" share one
+    registry entry instead of each loading the syllabus again.
+    """
+    def canonical(name, choices):
+        if not isinstance(name, str):
+            return None
+        wanted = " ".join(name.split()).lower()
+        return next((choice for choice in choices if choice.lower() == wanted), None)
+    
+    class_name, subject = canonical(class_name, AVAILABLE_CLASSES), canonical(subject, AVAILABLE_SUBJECTS)
+    if class_name is None or subject is None:
+        return None
+    return class_name, subject
+
+def unknown_syllabus_response(class_name, subject):
+    return jsonify({"status": "error", "message": f"Unknown class or subject: {class_name} - {subject}"}), 400
 
 @app.route('/api/classes', methods=['GET'])
 def get_classes():
@@ -285,7 +930,7 @@ def get_subjects():
     return jsonify(list(AVAILABLE_SUBJECTS.keys()))
 
 @app.route('/api/select', methods=['POST'])
-def select_class_subject():
+async def select_class_subject():
     global current_class, current_subject
     
     data = request.get_json()
@@ -295,51 +940,262 @@ def select_class_subject():
     if not selected_class or not selected_subject:
         return jsonify({"status": "error", "message": "Please select both class and subject."})
     
-    current_class = selected_class
-    current_subject = selected_subject
+    syllabus = resolve_syllabus(selected_class, selected_subject)
+    if syllabus is None:
+        return unknown_syllabus_response(selected_class, selected_subject)
+    selected_class, selected_subject = syllabus
     
-    class_folder = AVAILABLE_CLASSES[selected_class]
-    success = load_syllabus_data(class_folder, selected_subject)
+    # Selecting a syllabus again picks up changed zips, re-processing only what changed
+    corpus = await run_blocking(io_executor, syllabus_registry.get, selected_class, selected_subject, refresh=True)
     
-    if success:
+    if corpus is not None:
+        current_class = selected_class
+        current_subject = selected_subject
         return jsonify({"status": "success", "message": f"Ready! Selected: {selected_class} - {selected_subject}"})
     else:
         return jsonify({"status": "error", "message": f"No data found for {selected_class} - {selected_subject}"})
 
 
 @app.route('/api/ask', methods=['POST'])
-def ask_question():
+async def ask_question():
+    """Answer a question; with "debug": true the response includes a per-stage timing breakdown in ms"""
+    started = time.perf_counter()
     data = request.get_json()
     question = data.get('question')
-    use_voice = data.get('use_voice', False)
-    
-    voice_recognition = None
-    if use_voice:
-        voice_result = get_voice_input()
-        if not voice_result or any(x in voice_result.lower() for x in ["error", "sorry", "detected", "couldn't understand"]):
-            return jsonify({
-                "answer": voice_result, 
-                "is_voice_error": True,
-                "voice_input": voice_result
-            })
-        else:
-            question = voice_result
-            voice_recognition = voice_result
+    selected_class = data.get('class') or current_class
+    selected_subject = data.get('subject') or current_subject
+    debug = bool(data.get('debug'))
+    
+    with metrics.request() as timings:
+        corpus = None
+        if selected_class and selected_subject:
+            syllabus = resolve_syllabus(selected_class, selected_subject)
+            if syllabus is None:
+                return unknown_syllabus_response(selected_class, selected_subject)
+            corpus = await run_blocking(io_executor, syllabus_registry.get, *syllabus)
+        
+        if corpus is None:
+            return jsonify({"answer": "Please select a class and subject first."})
+        
+        try:
+            answer, sources = await coalesced_answer(corpus, question)
+        except (OllamaOverloaded, OllamaUnavailable) as e:
+            return ollama_error_response(e)
+        metrics.observe("ask", time.perf_counter() - started)
+    
+    result = {"answer": answer, "sources": sources}
+    if debug:
+        result["timings"] = timings
+    return jsonify(result)
+
+@app.route('/api/transcribe', methods=['POST'])
+async def transcribe_audio():
+    """Transcribe a recorded question sent as a multipart "audio" file or as the raw request body.
+
+    A raw body is decoded while it is still being received; multipart uploads
+    are spooled by the form parser first.
+    """
+    started = time.perf_counter()
+    upload = request.files.get('audio')
+    stream = upload.stream if upload is not None else request.stream
+    
+    try:
+        pcm, sample_rate = await run_blocking(io_executor, decode_audio, stream, MAX_AUDIO_SECONDS)
+    except (AudioDecodeError, AudioTooLong) as e:
+        transcriber.record(0, 0, 0, failed=True)
+        return jsonify({"status": "error", "message": str(e)}), 400
+    decode_seconds = time.perf_counter() - started
+    metrics.observe("transcribe_decode", decode_seconds)
+    audio_seconds = len(pcm) / (2 * sample_rate)
+    
+    try:
+        text, recognize_seconds = await asyncio.wrap_future(transcriber.submit(pcm, sample_rate))
+    except TranscriptionError as e:
+        print(f"Transcription error: {e}")
+        transcriber.record(audio_seconds, 0, 0, failed=True)
+        return jsonify({"status": "error", "message": "Speech recognition is not available right now."}), 500
+    
+    total_seconds = time.perf_counter() - started
+    transcriber.record(audio_seconds, recognize_seconds, total_seconds)
+    metrics.observe("transcribe", total_seconds)
+    real_time_factor = recognize_seconds / audio_seconds if audio_seconds else 0.0
+    print(
+        f"Transcribed {audio_seconds:.1f}s of audio in {total_seconds * 1000:.0f} ms "
+        f"(decode {decode_seconds * 1000:.0f} ms, real-time factor {real_time_factor:.2f})"
+    )
+    
+    if not text:
+        return jsonify({"status": "error", "message": "Sorry, I couldn't understand what you said. Please try again."})
+    return jsonify({
+        "status": "success",
+        "text": text,
+        "audio_seconds": audio_seconds,
+        "latency_ms": total_seconds * 1000,
+        "real_time_factor": real_time_factor
+    })
+
+def sse_event(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+@app.route('/api/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Stream the answer as Server-Sent Events: token events, then a final done event with timings"""
+    started = time.perf_counter()
+    data = request.get_json()
+    question = data.get('question')
+    selected_class = data.get('class') or current_class
+    selected_subject = data.get('subject') or current_subject
+    debug = bool(data.get('debug'))
+    
+    # Timings are collected in a context of their own that the token generator keeps running in
+    context = contextvars.copy_context()
+    timings = context.run(metrics.start_request)
+    
+    corpus = None
+    if question and selected_class and selected_subject:
+        syllabus = resolve_syllabus(selected_class, selected_subject)
+        if syllabus is None:
+            return unknown_syllabus_response(selected_class, selected_subject)
+        corpus = syllabus_registry.get(*syllabus)
+    
+    if corpus is None:
+        message = "Please select a class and subject first." if question else "Please ask a question."
+        tokens, sources = [message], []
+    else:
+        try:
+            tokens, sources = context.run(coalesced_stream, corpus, question)
+        except (OllamaOverloaded, OllamaUnavailable) as e:
+            return ollama_error_response(e)
+    
+    def generate():
+        first_token_at = None
+        try:
+            for token in Metrics.bind(iter(tokens), context):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.observe("ask_stream_first_token", first_token_at - started)
+                yield sse_event({"token": token})
+        except (OllamaUnavailable, StreamAbandoned) as e:
+            print(f"Ollama stream interrupted: {e}")
+            yield sse_event({"error": OLLAMA_ERROR_MESSAGE})
+        finally:
+            if hasattr(tokens, "close"):
+                tokens.close()
+        
+        finished = time.perf_counter()
+        ttft_ms = (first_token_at - started) * 1000 if first_token_at else None
+        total_ms = (finished - started) * 1000
+        print(f"Streamed answer: time to first token {ttft_ms or 0:.0f} ms, total {total_ms:.0f} ms")
+        metrics.observe("ask_stream", finished - started)
+        done = {"done": True, "ttft_ms": ttft_ms, "total_ms": total_ms, "sources": sources}
+        if debug:
+            done["timings"] = timings
+        yield sse_event(done)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/ask/batch', methods=['POST'])
+def ask_batch():
+    """Answer a list of questions as a background job.
+
+    Returns 202 with a job id to poll at /api/ask/batch/<job_id>; with
+    "stream": true the results are sent as Server-Sent Events as they
+    complete, in completion order, then a done event.
+    """
+    data = request.get_json()
+    questions = data.get('questions')
+    selected_class = data.get('class') or current_class
+    selected_subject = data.get('subject') or current_subject
+    
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        return jsonify({"status": "error", "message": "Please send a list of questions."}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({"status": "error", "message": f"At most {BATCH_MAX_QUESTIONS} questions per batch."}), 400
+    
+    corpus = None
+    if selected_class and selected_subject:
+        syllabus = resolve_syllabus(selected_class, selected_subject)
+        if syllabus is None:
+            return unknown_syllabus_response(selected_class, selected_subject)
+        corpus = syllabus_registry.get(*syllabus)
+    if corpus is None:
+        return jsonify({"status": "error", "message": "Please select a class and subject first."}), 400
     
-    if not all_documents:
-        return jsonify({
-            "answer": "Please select a class and subject first.",
-            "voice_input": voice_recognition
-        })
+    job = batch_jobs.start(questions, corpus)
+    metrics.count("batch_questions_total", len(questions))
+    if not data.get('stream'):
+        return jsonify(job.summary()), 202
     
-    answer = hybrid_answer_question(question)
+    def generate():
+        yield sse_event({"job_id": job.id, "total": len(job.questions)})
+        for result in job.follow():
+            yield sse_event(result)
+        yield sse_event({"done": True, **job.summary()})
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/ask/batch/<job_id>', methods=['GET'])
+def get_batch(job_id):
+    """Status of a batch job and the answers completed so far, in question order"""
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired batch job."}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
     return jsonify({
-        "answer": answer,
-        "voice_input": voice_recognition
+        "syllabi": syllabus_registry.stats(),
+        "ollama": ollama_gate.stats(),
+        "answer_cache": answer_cache.stats(),
+        "summaries": summary_jobs.stats(),
+        "query_embedding": query_batcher.stats(),
+        "router": query_router.stats(),
+        "batches": batch_jobs.stats(),
+        "ingestion": last_ingestion,
+        "coalescing": {"answers": answer_flights.stats(), "streams": stream_flights.stats()},
+        "transcription": transcriber.stats(),
+        "tts": speech_synthesizer.stats(),
+        "latency": metrics.summary(),
+        "warmup": warmup.stats()
     })
 
+@app.route('/api/ready', methods=['GET'])
+def get_ready():
+    """Readiness probe: 503 until the warm-up has loaded the models, starting it if it has not run"""
+    warmup.start()
+    ready = warmup.ready
+    response = jsonify({"ready": ready, **warmup.stats()})
+    response.status_code = 200 if ready else 503
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint: stage latency histograms, Ollama token counters and queue gauges"""
+    gate = ollama_gate.stats()
+    cache = answer_cache.stats()
+    gauges = {
+        "ollama_in_flight": ("Generations running on the model server.", gate["in_flight"]),
+        "ollama_queue_depth": ("Generations waiting for a model slot.", gate["queue_depth"]),
+        "ollama_rejected": ("Generations rejected because the queue was full or timed out.", gate["rejected"] + gate["timed_out"]),
+        "answer_cache_hit_rate": ("Fraction of answer cache lookups that hit.", cache["hit_rate"]),
+        "syllabus_memory_bytes": ("Approximate memory held by resident syllabi.", syllabus_registry.stats()["memory_bytes"]),
+        "ingest_peak_rss_bytes": ("Resident memory high-water mark during the last PDF ingestion.", last_ingestion.get("peak_rss_bytes") or 0),
+    }
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
 @app.route('/api/tts', methods=['POST'])
 def text_to_speech():
+    """Speak an answer as a streamed MP3, sentence by sentence"""
+    started = time.perf_counter()
     data = request.get_json()
     text = data.get('text', '')
     
@@ -347,25 +1203,15 @@ def text_to_speech():
         return jsonify({"status": "error", "message": "No text provided"})
     
     try:
-        tts = gTTS(
-            text=text, 
-            lang='en', 
-            slow=False,  
-            lang_check=False  
-        )
-        
-        audio_buffer = io.BytesIO()
-        tts.write_to_fp(audio_buffer)
-        audio_buffer.seek(0)
-        
-        return send_file(
-            audio_buffer,
-            mimetype='audio/mpeg',
-            as_attachment=False
-        )
-            
+        audio = speech_synthesizer.stream(text, started)
     except Exception as e:
         return jsonify({"status": "error", "message": f"TTS error: {str(e)}"})
+    metrics.observe("tts_first_audio", time.perf_counter() - started)
+    
+    return Response(audio, mimetype='audio/mpeg', headers={"Cache-Control": "no-cache"})
 
 if __name__ == '__main__':
+    # The debug reloader imports this file in a watcher process too; only the serving child warms up
+    if WARMUP_ON_START and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""Background jobs that answer a list of questions (a worksheet or quiz).
+
+Each job runs on a thread of its own and publishes results as they
+complete. A client can follow them as a stream or poll the job by id;
+finished jobs are kept for a while so their results can still be
+fetched.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class BatchJob:
+    """Results of one batch in completion order, and whether it has finished"""
+
+    def __init__(self, questions):
+        self.id = uuid.uuid4().hex
+        self.questions = list(questions)
+        self.results = []
+        self.done = False
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    def add(self, result):
+        with self._cond:
+            self.results.append(result)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def follow(self):
+        """Yield every result, waiting for the ones still being answered"""
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.results) and not self.done:
+                    self._cond.wait()
+                if position >= len(self.results):
+                    return
+                result = self.results[position]
+            position += 1
+            yield result
+
+    def summary(self):
+        with self._cond:
+            failed = sum(1 for result in self.results if "error" in result)
+            seconds = (self.finished or time.time()) - self.started
+            summary = {
+                "job_id": self.id,
+                "status": "done" if self.done else "running",
+                "total": len(self.questions),
+                "completed": len(self.results),
+                "failed": failed,
+                "seconds": seconds,
+            }
+            if self.error is not None:
+                summary["error"] = self.error
+            return summary
+
+    def snapshot(self):
+        """Summary plus the results so far, in question order"""
+        with self._cond:
+            results = sorted(self.results, key=lambda result: result["index"])
+        return {**self.summary(), "results": results}
+
+
+class BatchJobs:
+    """Starts batch jobs and keeps the most recent ones for polling.
+
+    `answer_batch(job, *args)` answers the job's questions, calling
+    job.add(result) as each completes.
+    """
+
+    def __init__(self, answer_batch, max_jobs=100, ttl=3600):
+        self.answer_batch = answer_batch
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.questions = 0
+
+    def start(self, questions, *args):
+        job = BatchJob(questions)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+            self.started += 1
+            self.questions += len(job.questions)
+        threading.Thread(target=self._run, args=(job, args), name=f"batch-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def _run(self, job, args):
+        try:
+            self.answer_batch(job, *args)
+            job.finish()
+        except Exception as e:
+            print(f"Batch {job.id} failed: {e}")
+            job.finish(error=str(e))
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            expired = job.done and now - job.finished > self.ttl
+            if expired or (len(self._jobs) >= self.max_jobs and job.done):
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job.done)
+            return {"jobs": self.started, "questions": self.questions, "running": running, "kept": len(self._jobs)}
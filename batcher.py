@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+
+
+class MicroBatcher:
+    """Collects concurrent embedding requests into batched model calls.
+
+    The first waiting text opens a window of `window_ms`; everything that
+    arrives before it closes (up to `max_batch` texts) is embedded with a
+    single `embed_batch(texts)` call on the batcher thread, and each caller
+    gets its own vector back.
+    """
+
+    def __init__(self, embed_batch, window_ms=5, max_batch=32):
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+        self.histogram = {}
+
+    def embed(self, text):
+        """Embed one text, blocking until its batch has run"""
+        return self.submit(text).result()
+
+    def submit(self, text):
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embed_batch(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            self._record(len(batch))
+
+    def _record(self, size):
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "queries": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                # batch size upper bound (powers of two) -> number of batches
+                "batch_size_histogram": {f"<={size}": count for size, count in sorted(self.histogram.items())},
+            }
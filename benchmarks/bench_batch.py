@@ -0,0 +1,113 @@
+"""Worksheet throughput: /api/ask/batch versus asking the questions one by one.
+
+Generates a syllabus zip and starts the stand-in Ollama server
+(fake_ollama.py), then answers the same list of questions twice through
+the Flask test client: as a sequential loop of /api/ask calls (what the
+Streamlit client did) and as one streamed /api/ask/batch request. The
+answer cache is disabled so both reach the model for every question, and
+the PDF summaries are built beforehand so they do not take model slots.
+
+    python benchmarks/bench_batch.py --questions 50 --ollama-parallel 2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_ollama import FakeOllama
+from run_suite import make_questions
+from synthetic import make_syllabus_zip
+
+
+def sequential(client, payload, questions):
+    for question in questions:
+        response = client.post("/api/ask", json={**payload, "question": question})
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/ask failed: {response.status_code} {response.get_json()}")
+
+
+def batched(client, payload, questions):
+    """Stream one batch and return when its done event arrives"""
+    response = client.post("/api/ask/batch", json={**payload, "questions": questions, "stream": True})
+    answered = 0
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith("data: "):
+            event = json.loads(line[len("data: "):])
+            if "index" in event:
+                answered += 1
+            if event.get("done"):
+                return answered, event
+    raise RuntimeError("/api/ask/batch ended without a done event")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--pdfs", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--token-ms", type=float, default=20.0, help="fake Ollama delay per generated token")
+    parser.add_argument("--tokens", type=int, default=60, help="fake Ollama answer length")
+    parser.add_argument("--ollama-parallel", type=int, default=2, help="generations the fake Ollama runs at once")
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.token_ms, 0.5, 0.0, args.tokens, args.ollama_parallel)
+    ollama_url = fake.start()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            import app
+            app.warmup.start()
+            app.warmup.wait()
+            app.ollama_client.api_url = ollama_url
+            # Similarity never exceeds 1, so every question reaches the model
+            app.answer_cache.threshold = 1.01
+            app.COALESCE_REQUESTS = False
+
+            class_name = next(iter(app.AVAILABLE_CLASSES))
+            folder = os.path.join("datasets", app.AVAILABLE_CLASSES[class_name])
+            os.makedirs(folder)
+            make_syllabus_zip(os.path.join(folder, "bench_books.zip"), pdfs=args.pdfs, pages=args.pages)
+            # Requests may only name listed subjects
+            app.AVAILABLE_SUBJECTS["bench"] = "bench"
+            payload = {"class": class_name, "subject": "bench"}
+            client = app.app.test_client()
+            client.post("/api/select", json=payload)
+            # Summaries are built in the background on first use and would hold a model slot while timing
+            corpus = app.syllabus_registry.get(class_name, "bench")
+            for pdf_name in corpus.chunks.pdf_rows:
+                app.get_pdf_summary(corpus, pdf_name)
+            while app.summary_jobs.stats()["pending"]:
+                time.sleep(0.1)
+
+            questions = make_questions(args.questions)
+            # One round of each first, so model and tokenizer loading is not timed
+            sequential(client, payload, questions[:2])
+            batched(client, payload, questions[:2])
+
+            start = time.perf_counter()
+            sequential(client, payload, questions)
+            sequential_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            answered, done = batched(client, payload, questions)
+            batch_seconds = time.perf_counter() - start
+        finally:
+            fake.stop()
+            os.chdir(cwd)
+
+    print(f"\n{len(questions)} questions, fake Ollama {args.tokens} tokens at {args.token_ms:.0f} ms, "
+          f"{args.ollama_parallel} parallel; BATCH_CONCURRENCY {app.BATCH_CONCURRENCY}")
+    print(f"{'mode':>12} {'seconds':>8} {'questions/s':>12}")
+    print(f"{'sequential':>12} {sequential_seconds:>8.2f} {len(questions) / sequential_seconds:>12.2f}")
+    print(f"{'batch':>12} {batch_seconds:>8.2f} {answered / batch_seconds:>12.2f}")
+    print(f"Batch: {done['completed']} answered, {done['failed']} failed; "
+          f"{sequential_seconds / batch_seconds:.2f}x the sequential throughput")
+
+
+if __name__ == "__main__":
+    main()
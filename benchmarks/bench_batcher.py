@@ -0,0 +1,66 @@
+"""Query-embedding throughput with and without the micro-batcher.
+
+N client threads each embed a stream of questions, either one model call per
+question or through MicroBatcher. Uses the real MiniLM model by default; pass
+--simulated to model a forward pass as fixed overhead plus per-item cost when
+sentence-transformers is not installed.
+
+    python benchmarks/bench_batcher.py --clients 1 8 32 --window-ms 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batcher import MicroBatcher
+
+
+# One model instance on a CPU: forward passes run one at a time
+_model_lock = threading.Lock()
+
+
+def simulated_embed(texts, overhead=0.008, per_item=0.0008, dim=384):
+    with _model_lock:
+        time.sleep(overhead + per_item * len(texts))
+    return [[0.0] * dim for _ in texts]
+
+
+def run(embed_one, clients, per_client):
+    questions = [f"question {c}-{i} about plants and water" for c in range(clients) for i in range(per_client)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(embed_one, questions))
+    return len(questions) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--per-client", type=int, default=20)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--simulated", action="store_true")
+    args = parser.parse_args()
+
+    if args.simulated:
+        embed_batch = simulated_embed
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embed_batch = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2").embed_documents
+        embed_batch(["warm up"])
+
+    print(f"{'clients':>8} {'unbatched q/s':>14} {'batched q/s':>12} {'avg batch':>10}")
+    for clients in args.clients:
+        unbatched = run(lambda text: embed_batch([text])[0], clients, args.per_client)
+        batcher = MicroBatcher(embed_batch, args.window_ms, args.max_batch)
+        batched = run(batcher.embed, clients, args.per_client)
+        print(f"{clients:>8} {unbatched:>14.1f} {batched:>12.1f} {batcher.stats()['avg_batch_size']:>10.1f}")
+        print(f"{'':>8} batch sizes: {batcher.stats()['batch_size_histogram']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Memory held by a syllabus's chunk texts: Documents versus the ChunkStore arena.
+
+Generates chunk texts, serializes them the way the corpus cache stores them,
+then loads them back into the old representation (a LangChain Document with
+a metadata dict per chunk, plus the per-PDF lists of strings) and into a
+ChunkStore. Reports the memory each retains (traced with tracemalloc), the
+build time and the cost of reading one chunk.
+
+    python benchmarks/bench_chunk_memory.py --chunks 10000 --pdfs 40
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_store import ChunkStore
+from synthetic import page_text
+
+
+def cache_payload(chunks, pdfs, chunk_chars, seed=0):
+    """chunks.json content for `chunks` texts of about chunk_chars characters over `pdfs` PDFs"""
+    rng = random.Random(seed)
+    per_pdf = -(-chunks // pdfs)
+    payload = {"pdfs": []}
+    for pdf in range(pdfs):
+        count = min(per_pdf, chunks - pdf * per_pdf)
+        texts = [page_text(rng, chunk_chars // 5)[:chunk_chars] for _ in range(count)]
+        payload["pdfs"].append({"name": f"book_{pdf + 1}.pdf", "chunks": texts})
+    return json.dumps(payload)
+
+
+def load_documents(payload):
+    from langchain.schema import Document
+
+    pdf_chunks = {pdf["name"]: pdf["chunks"] for pdf in json.loads(payload)["pdfs"]}
+    documents = []
+    for pdf_name, texts in pdf_chunks.items():
+        for i, text in enumerate(texts):
+            documents.append(Document(page_content=text, metadata={"source": pdf_name, "chunk": i}))
+    return pdf_chunks, documents
+
+
+def load_store(payload):
+    return ChunkStore.build((pdf["name"], pdf["chunks"]) for pdf in json.loads(payload)["pdfs"])
+
+
+def retained(build, payload):
+    """(result, bytes still allocated after building it, build seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(payload)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, seconds
+
+
+def access_us(read, count, reads=20000, seed=1):
+    rng = random.Random(seed)
+    rows = [rng.randrange(count) for _ in range(reads)]
+    start = time.perf_counter()
+    for row in rows:
+        read(row)
+    return (time.perf_counter() - start) / reads * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--pdfs", type=int, default=40)
+    parser.add_argument("--chunk-chars", type=int, default=500)
+    args = parser.parse_args()
+
+    payload = cache_payload(args.chunks, args.pdfs, args.chunk_chars)
+    per_10k = 10000 / args.chunks
+    print(f"{args.chunks} chunks of ~{args.chunk_chars} characters in {args.pdfs} PDFs")
+    print(f"{'representation':>28} {'MB':>8} {'MB/10k':>8} {'build s':>8} {'read us':>8}")
+
+    rows = []
+    try:
+        # Imported before tracing so the module itself is not counted
+        import langchain.schema  # noqa: F401
+
+        (pdf_chunks, documents), size, seconds = retained(load_documents, payload)
+
+        def read(row):
+            metadata = documents[row].metadata
+            return metadata["source"], metadata["chunk"], documents[row].page_content
+
+        rows.append(("Documents + pdf_chunks", size, seconds, access_us(read, len(documents))))
+        del pdf_chunks, documents
+    except ImportError:
+        print("langchain is not installed; skipping the Document representation")
+    store, size, seconds = retained(load_store, payload)
+    rows.append(("ChunkStore", size, seconds, access_us(store.chunk, len(store))))
+
+    for name, size, seconds, read in rows:
+        print(f"{name:>28} {size / 1e6:>8.2f} {size / 1e6 * per_10k:>8.2f} {seconds:>8.3f} {read:>8.2f}")
+    print(f"{'ChunkStore.nbytes estimate':>28} {store.nbytes / 1e6:>8.2f} {store.nbytes / 1e6 * per_10k:>8.2f}")
+    if len(rows) == 2:
+        print(f"\nChunkStore retains {rows[1][1] / rows[0][1]:.0%} of the memory of Documents + pdf_chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Peak memory of PDF ingestion: whole-file extraction versus page-by-page streaming.
+
+Generates a zip with large scan-like PDFs (a random-noise image on every
+page) or uses --zip, then ingests it without embedding, once per mode, each
+in a fresh subprocess so the resident memory high-water marks do not mix:
+
+  whole      the previous pipeline: read the PDF from the zip into bytes,
+             join the text of all pages, clean and split it in one go
+  streaming  ingest.ingest_zip: PDFs above SPOOL_PDF_MB spooled to disk and
+             opened by path, pages extracted and split one at a time
+
+Reports the peak RSS over the process's RSS once the libraries are imported
+(Linux only: the peak is read from /proc/self/status).
+
+    python benchmarks/bench_extract_memory.py --pdfs 2 --pages 60
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ingest
+
+
+def current_rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def ingest_whole(zip_path, chunk_size, chunk_overlap):
+    """The extraction ingest.py did before page-level streaming"""
+    import zipfile
+
+    import fitz
+
+    chunks = pages = 0
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        for info in zf.infolist():
+            if not info.filename.endswith(".pdf"):
+                continue
+            with zf.open(info) as pdf_file:
+                pdf_bytes = pdf_file.read()
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            text = "\n".join(page.get_text() for page in doc)
+            pages += doc.page_count
+            doc.close()
+            chunks += len(ingest.get_splitter(chunk_size, chunk_overlap).split_text(ingest.clean_text(text)))
+    return pages, chunks, ingest.peak_rss_bytes()
+
+
+def ingest_streaming(zip_path, chunk_size, chunk_overlap):
+    _, _, stats = ingest.ingest_zip(zip_path, chunk_size, chunk_overlap, workers=1)
+    return stats["pages"], stats["chunks"], stats["peak_rss_bytes"]
+
+
+def measure(mode, zip_path, chunk_size, chunk_overlap):
+    """Run one mode in this process and print its figures as JSON"""
+    import fitz  # noqa: F401
+
+    ingest.get_splitter(chunk_size, chunk_overlap)
+    ingest.reset_peak_rss()
+    baseline = current_rss_bytes()
+    start = time.perf_counter()
+    run = ingest_whole if mode == "whole" else ingest_streaming
+    pages, chunks, peak = run(zip_path, chunk_size, chunk_overlap)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"mode": mode, "pages": pages, "chunks": chunks, "seconds": seconds,
+                      "baseline_bytes": baseline, "peak_bytes": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zip", help="existing syllabus zip to ingest")
+    parser.add_argument("--pdfs", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[700, 900], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--measure", choices=("whole", "streaming"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.zip, args.chunk_size, args.chunk_overlap)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = args.zip
+        if zip_path is None:
+            from synthetic import make_syllabus_zip
+
+            zip_path = os.path.join(tmp, "scanned_books.zip")
+            make_syllabus_zip(zip_path, pdfs=args.pdfs, pages=args.pages, image_size=tuple(args.image_size))
+        print(f"{os.path.getsize(zip_path) / 1e6:.1f} MB zip")
+        print(f"{'mode':>10} {'pages':>6} {'chunks':>7} {'seconds':>8} {'peak over baseline MB':>22}")
+        for mode in ("whole", "streaming"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--measure", mode, "--zip", zip_path,
+                 "--chunk-size", str(args.chunk_size), "--chunk-overlap", str(args.chunk_overlap)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            growth = (result["peak_bytes"] - result["baseline_bytes"]) / 1e6
+            print(f"{mode:>10} {result['pages']:>6} {result['chunks']:>7} {result['seconds']:>8.2f} {growth:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Recall@k and latency of the ANN indexes against exact flat search.
+
+Builds each index over synthetic clustered embeddings (or a saved .npy
+matrix via --vectors) and reports build time, per-query latency and
+recall@k versus the exact top-k for a sweep of IVF nprobe values, the
+int8 quantized index for a sweep of rescoring factors, plus HNSW when
+hnswlib is installed. The memory column is what each index keeps in RAM,
+counting the float32 vectors for the indexes that scan them.
+
+    python benchmarks/bench_index.py --chunks 200000 --nprobe 4 8 16 32 --rescore 1 2 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_index
+from vector_index import FlatIndex, IVFIndex, Int8Index, normalize_rows, recall_at_k, sample_queries
+
+
+def clustered_vectors(n, dim, clusters, seed=0):
+    """Embedding-like data: points scattered around random topic directions"""
+    rng = np.random.default_rng(seed)
+    topics = normalize_rows(rng.standard_normal((clusters, dim)))
+    labels = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+    return normalize_rows(topics[labels] + 2.0 * noise)
+
+
+def query_latency_ms(index, queries, k):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k)
+        timings.append(time.perf_counter() - start)
+    return float(np.percentile(timings, 50) * 1000)
+
+
+def report(name, index, build_seconds, vectors, queries, k):
+    recall = recall_at_k(index, vectors, queries, k)
+    latency = query_latency_ms(index, queries, k)
+    memory = index.nbytes + (vectors.nbytes if getattr(index, "scans_vectors", True) else 0)
+    print(f"{name:<18} {build_seconds:>9.2f} {latency:>10.3f} {recall:>10.3f} {memory / 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", help="saved float32 embeddings (.npy)")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = normalize_rows(np.load(args.vectors, mmap_mode="r"))
+    else:
+        vectors = clustered_vectors(args.chunks, args.dim, args.clusters)
+    queries = sample_queries(vectors, args.queries)
+
+    print(f"{vectors.shape[0]} vectors, {vectors.shape[1]} dims, recall@{args.k}")
+    print(f"{'index':<18} {'build s':>9} {'p50 ms':>10} {'recall':>10} {'memory MB':>10}")
+    report("flat", FlatIndex(vectors), 0.0, vectors, queries, args.k)
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(vectors, nlist=args.nlist)
+    build_seconds = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        report(f"ivf nprobe={nprobe}", ivf, build_seconds, vectors, queries, args.k)
+
+    start = time.perf_counter()
+    int8 = Int8Index.build(vectors)
+    build_seconds = time.perf_counter() - start
+    for rescore in args.rescore:
+        int8.rescore = rescore
+        report(f"int8 rescore={rescore}", int8, build_seconds, vectors, queries, args.k)
+
+    if vector_index.hnswlib is not None:
+        start = time.perf_counter()
+        hnsw = vector_index.HNSWIndex.build(vectors)
+        report("hnsw", hnsw, time.perf_counter() - start, vectors, queries, args.k)
+    else:
+        print("hnsw               skipped (pip install hnswlib)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Ingestion throughput of the PDF pipeline for 1..N worker processes.
+
+Generates a synthetic syllabus zip (or uses --zip) and reports pages/sec and
+chunks/sec per worker count. Embedding is skipped unless --embed is given, in
+which case the real MiniLM model is loaded and called in batches.
+
+    python benchmarks/bench_ingestion.py --max-workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest
+from synthetic import make_syllabus_zip
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zip", help="existing syllabus zip to ingest")
+    parser.add_argument("--pdfs", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--embed", action="store_true", help="include batched embedding")
+    parser.add_argument("--batch-size", type=int, default=ingest.EMBED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    embed_batch = None
+    if args.embed:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embed_batch = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2").embed_documents
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = args.zip
+        if zip_path is None:
+            zip_path = os.path.join(tmp, "bench_books.zip")
+            make_syllabus_zip(zip_path, pdfs=args.pdfs, pages=args.pages)
+
+        print(f"{'workers':>8} {'pages':>7} {'chunks':>7} {'seconds':>8} {'pages/s':>9} {'chunks/s':>9} {'peak MB':>8}")
+        for workers in range(1, args.max_workers + 1):
+            # warm the pool so process start-up is not counted
+            if workers > 1:
+                ingest.ingest_zip(zip_path, 500, 50, workers=workers)
+            _, _, stats = ingest.ingest_zip(
+                zip_path, 500, 50, embed_batch=embed_batch, workers=workers, batch_size=args.batch_size
+            )
+            seconds = stats["seconds"]
+            print(f"{workers:>8} {stats['pages']:>7} {stats['chunks']:>7} {seconds:>8.2f} "
+                  f"{stats['pages'] / seconds:>9.1f} {stats['chunks'] / seconds:>9.1f} {(stats['peak_rss_bytes'] or 0) / 1e6:>8.0f}")
+        ingest.shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Reload time after one textbook changes: incremental update versus full rebuild.
+
+Builds a synthetic class folder of several subject zips in a temporary
+directory, loads it through the app, replaces one PDF inside one zip and
+reloads. The incremental reload re-processes only that PDF; the full rebuild
+starts from an empty cache. Uses the real embedding model.
+
+    python benchmarks/bench_reindex.py --zips 3 --pdfs 6 --pages 20
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import make_pdf, make_syllabus_zip
+
+
+def replace_pdf(zip_path, pdf_name, pdf_bytes):
+    """Rewrite a zip with one PDF's content replaced"""
+    tmp_path = zip_path + ".tmp"
+    with zipfile.ZipFile(zip_path, "r") as source, zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            data = pdf_bytes if info.filename == pdf_name else source.read(info)
+            target.writestr(info.filename, data)
+    os.replace(tmp_path, zip_path)
+
+
+def timed_load(app, class_name, refresh=False):
+    start = time.perf_counter()
+    corpus = app.syllabus_registry.get(class_name, "books", refresh=refresh)
+    return time.perf_counter() - start, corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zips", type=int, default=3)
+    parser.add_argument("--pdfs", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import app
+
+        class_name = next(iter(app.AVAILABLE_CLASSES))
+        folder = os.path.join("datasets", app.AVAILABLE_CLASSES[class_name])
+        os.makedirs(folder)
+        for i in range(args.zips):
+            make_syllabus_zip(os.path.join(folder, f"books_{i + 1}.zip"), pdfs=args.pdfs, pages=args.pages,
+                              seed=i, prefix=f"subject{i + 1}_book")
+
+        cold, corpus = timed_load(app, class_name)
+        chunks = len(corpus.chunks)
+
+        changed_zip = os.path.join(folder, "books_1.zip")
+        replace_pdf(changed_zip, "subject1_book_1.pdf", make_pdf(random.Random(99), args.pages, 350, "revised"))
+        incremental, corpus = timed_load(app, class_name, refresh=True)
+
+        shutil.rmtree(app.corpus_cache.CACHE_DIR)
+        app.manifest = app.corpus_cache.Manifest(os.path.join(app.corpus_cache.CACHE_DIR, "manifest.json"))
+        app.syllabus_registry.invalidate(class_name, "books")
+        full, _ = timed_load(app, class_name)
+
+        print()
+        print(f"{args.zips} zips x {args.pdfs} PDFs x {args.pages} pages, {chunks} chunks")
+        print(f"{'first load':>22}: {cold:8.2f}s")
+        print(f"{'one PDF changed':>22}: {incremental:8.2f}s (incremental)")
+        print(f"{'full rebuild':>22}: {full:8.2f}s")
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Per-query retrieval latency: re-embedding every chunk versus precomputed embeddings.
+
+For increasing numbers of N chunks, times one question three ways:
+
+  re-embed     the original retrieve_context: embed the question and every
+               chunk, then score them (only run up to --baseline-max chunks,
+               with --baseline-queries questions, since it grows with N)
+  precomputed  embed the question, then one matmul plus a partial top-k
+               against the normalized chunk matrix computed at load time
+  search       the matmul and top-k alone
+
+Uses the real MiniLM model by default; pass --simulated to model a forward
+pass as fixed overhead plus per-item cost when sentence-transformers is not
+installed.
+
+    python benchmarks/bench_retrieval.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import WORDS, page_text
+from vector_index import normalize_rows, search
+
+
+def simulated_embedder(dim, overhead=0.008, per_item=0.0008, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def embed(texts):
+        time.sleep(overhead + per_item * len(texts))
+        return rng.standard_normal((len(texts), dim)).astype(np.float32).tolist()
+    return embed
+
+
+def chunk_texts(count, seed=0):
+    rng = random.Random(seed)
+    return [page_text(rng, 80) for _ in range(count)]
+
+
+def time_calls(fn, items):
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def re_embed(embed_batch, texts, k):
+    """The path precomputation replaced: every chunk is embedded again for each question"""
+    def retrieve(question):
+        query = embed_batch([question])[0]
+        return search(normalize_rows(embed_batch(texts)), query, k)
+    return retrieve
+
+
+def precomputed(embed_batch, matrix, k):
+    def retrieve(question):
+        return search(matrix, embed_batch([question])[0], k)
+    return retrieve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--baseline-queries", type=int, default=5)
+    parser.add_argument("--baseline-max", type=int, default=5000, help="largest N to run the re-embedding path for")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--simulated", action="store_true")
+    args = parser.parse_args()
+
+    if args.simulated:
+        embed_batch = simulated_embedder(args.dim, seed=args.seed)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embed_batch = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2").embed_documents
+        embed_batch(["warm up"])
+
+    rng = np.random.default_rng(args.seed)
+    words = random.Random(args.seed).choices(WORDS, k=args.queries)
+    questions = [f"what does the {word} need to grow" for word in words]
+    query_vectors = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    print(f"{'chunks':>10} {'re-embed p50 ms':>16} {'precomputed p50 ms':>19} {'search p50 ms':>14} {'search p95 ms':>14}")
+    for size in args.sizes:
+        texts = chunk_texts(size, args.seed)
+        matrix = normalize_rows(embed_batch(texts))
+
+        baseline = "skipped"
+        if size <= args.baseline_max:
+            timings = time_calls(re_embed(embed_batch, texts, args.k), questions[:args.baseline_queries])
+            baseline = f"{np.percentile(timings, 50):.1f}"
+        with_query = time_calls(precomputed(embed_batch, matrix, args.k), questions)
+        search(matrix, query_vectors[0], args.k)
+        search_only = time_calls(lambda query: search(matrix, query, args.k), query_vectors)
+        print(f"{size:>10} {baseline:>16} {np.percentile(with_query, 50):>19.3f} "
+              f"{np.percentile(search_only, 50):>14.3f} {np.percentile(search_only, 95):>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
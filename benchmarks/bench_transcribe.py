@@ -0,0 +1,52 @@
+"""Latency and real-time factor of /api/transcribe.
+
+Uploads a recorded question to a running backend from 1, 2 and 4 concurrent
+clients (configurable) and reports latency percentiles together with the
+real-time factor (recognition seconds per second of audio) the server
+measured. Start the server first, e.g. `python serve.py`.
+
+    python benchmarks/bench_transcribe.py question.wav --concurrency 1 2 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+def transcribe(url, name, audio):
+    start = time.perf_counter()
+    response = requests.post(f"{url}/transcribe", files={"audio": (name, audio)}, timeout=300)
+    return time.perf_counter() - start, response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("audio", help="recorded question (WAV, or any format when ffmpeg is installed)")
+    parser.add_argument("--url", default="http://localhost:5000/api")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    name = os.path.basename(args.audio)
+
+    first = transcribe(args.url, name, audio)[1]
+    print(f"Transcript: {first.get('text') or first.get('message')!r} ({first.get('audio_seconds', 0):.1f}s of audio)")
+
+    print(f"{'clients':>8} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'server RTF':>11}")
+    for concurrency in args.concurrency:
+        total = concurrency * args.requests_per_client
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda _: transcribe(args.url, name, audio), range(total)))
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        factors = [result["real_time_factor"] for _, result in results if "real_time_factor" in result]
+        print(f"{concurrency:>8} {total:>9} {np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 95):>8.0f} "
+              f"{np.mean(factors) if factors else float('nan'):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
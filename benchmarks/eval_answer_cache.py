@@ -0,0 +1,69 @@
+"""Paraphrase reuse and wrong reuse of the answer cache across similarity thresholds.
+
+Embeds both questions of every pair in a labelled JSONL file ({"first": ...,
+"second": ..., "same": true/false} per line, "same" when one answer serves
+both) and, for each threshold, counts the paraphrases that would reuse a
+cached answer and the non-paraphrases that would wrongly get one: on
+similarity alone, with the number and negation guard (key_terms), and with
+the exact normalized match required on the factual route. Assumes both
+questions retrieved the same chunks, the worst case for wrong reuse.
+
+    python benchmarks/eval_answer_cache.py --pairs benchmarks/cache_pairs.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from answer_cache import key_terms, normalize_question
+from vector_index import normalize_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", default=os.path.join(ROOT, "benchmarks", "cache_pairs.jsonl"))
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[0.80, 0.85, 0.88, 0.90, 0.92, 0.94, 0.96, 0.98])
+    parser.add_argument("--show-errors", action="store_true", help="print the pairs wrongly reused at the configured threshold")
+    args = parser.parse_args()
+
+    with open(args.pairs, "r", encoding="utf-8") as f:
+        pairs = [json.loads(line) for line in f if line.strip()]
+
+    os.chdir(ROOT)
+    import app
+
+    first = normalize_rows(app.embedding_model.embed_documents([pair["first"] for pair in pairs]))
+    second = normalize_rows(app.embedding_model.embed_documents([pair["second"] for pair in pairs]))
+    similarity = np.sum(first * second, axis=1)
+    same = np.array([pair["same"] for pair in pairs])
+    terms = np.array([key_terms(pair["first"]) == key_terms(pair["second"]) for pair in pairs])
+    exact = np.array([normalize_question(pair["first"]) == normalize_question(pair["second"]) for pair in pairs])
+
+    print(f"{same.sum()} paraphrase pairs, {(~same).sum()} non-paraphrase pairs; "
+          f"similarity of paraphrases p10 {np.percentile(similarity[same], 10):.3f}, "
+          f"of non-paraphrases p90 {np.percentile(similarity[~same], 90):.3f}")
+    print(f"{'threshold':>10} {'reused':>8} {'wrong':>7} {'reused+terms':>13} {'wrong+terms':>12} "
+          f"{'factual reused':>15} {'factual wrong':>14}")
+    for threshold in args.thresholds:
+        similar = similarity >= threshold
+        guarded = similar & terms
+        factual = guarded & exact
+        print(f"{threshold:>10.2f} {(similar & same).sum() / same.sum():>8.1%} {(similar & ~same).sum():>7} "
+              f"{(guarded & same).sum() / same.sum():>13.1%} {(guarded & ~same).sum():>12} "
+              f"{(factual & same).sum() / same.sum():>15.1%} {(factual & ~same).sum():>14}")
+
+    if args.show_errors:
+        print()
+        for pair, score, matched in zip(pairs, similarity, terms):
+            if not pair["same"] and score >= app.ANSWER_CACHE_THRESHOLD:
+                print(f"{score:.3f} {'reused' if matched else 'guarded':>8}  {pair['first']!r} / {pair['second']!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Hit@k of dense-only versus hybrid (dense + BM25) retrieval on a loaded syllabus.
+
+Queries come from a labelled JSONL file (one {"question": ..., "expected": ...}
+per line, where `expected` is text the relevant chunk must contain), or are
+generated from the corpus as short keyword queries made of a chunk's rarest
+terms, the kind of chapter-title / proper-noun lookup dense search misses.
+Also reports the average context length at each k, since a smaller k that
+keeps the same hit rate means shorter prompts.
+
+    python benchmarks/eval_retrieval.py --class "Class 3" --subject EVS
+    python benchmarks/eval_retrieval.py --class "Class 4" --subject Maths --queries labelled.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bm25 import tokenize
+
+
+def synthetic_queries(corpus, count, terms_per_query=3, seed=0):
+    """Keyword queries from each sampled chunk's highest-idf terms; the chunk itself is the answer"""
+    lexical = corpus.lexical_index
+    rng = random.Random(seed)
+    queries = []
+    for idx in rng.sample(range(len(corpus.chunks)), min(count, len(corpus.chunks))):
+        terms = set(tokenize(corpus.chunks[idx]))
+        ranked = sorted(terms, key=lambda term: -lexical.idf[lexical.vocabulary[term]])
+        if len(ranked) >= terms_per_query:
+            queries.append({"question": " ".join(ranked[:terms_per_query]), "chunk": idx})
+    return queries
+
+
+def is_hit(corpus, query, indices):
+    if "chunk" in query:
+        return query["chunk"] in indices
+    expected = query["expected"].lower()
+    return any(expected in corpus.chunks[idx].lower() for idx in indices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--class", dest="class_name", default="Class 3")
+    parser.add_argument("--subject", default="EVS")
+    parser.add_argument("--queries", help="labelled JSONL file")
+    parser.add_argument("--synthetic", type=int, default=200, help="number of generated queries")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3, 5, 10])
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    import app
+
+    corpus = app.syllabus_registry.get(args.class_name, args.subject)
+    if corpus is None:
+        sys.exit(f"No syllabus found for {args.class_name} - {args.subject}")
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = synthetic_queries(corpus, args.synthetic)
+
+    embeddings = app.embedding_model.embed_documents([query["question"] for query in queries])
+    max_k = max(args.k)
+    rankings = {"dense": [], "hybrid": []}
+    for query, embedding in zip(queries, embeddings):
+        for mode in rankings:
+            rankings[mode].append(app.search_chunks(corpus, query["question"], embedding, max_k, hybrid=mode == "hybrid"))
+
+    print(f"{len(queries)} queries on {args.class_name} - {args.subject} ({len(corpus.chunks)} chunks)")
+    print(f"{'k':>3} {'dense hit@k':>12} {'hybrid hit@k':>13} {'context chars':>14}")
+    results = {}
+    for k in args.k:
+        hits = {
+            mode: np.mean([is_hit(corpus, query, ranking[:k]) for query, ranking in zip(queries, ranked)])
+            for mode, ranked in rankings.items()
+        }
+        chars = np.mean([sum(len(corpus.chunks[idx]) for idx in ranking[:k])
+                         for ranking in rankings["hybrid"]])
+        results[k] = hits
+        print(f"{k:>3} {hits['dense']:>12.3f} {hits['hybrid']:>13.3f} {chars:>14.0f}")
+
+    baseline_k = app.GENERAL_TOP_K
+    if baseline_k in results:
+        target = results[baseline_k]["dense"]
+        smallest = next((k for k in sorted(results) if results[k]["hybrid"] >= target), None)
+        print(f"Dense hit@{baseline_k} = {target:.3f}; hybrid matches it from k = {smallest}")
+
+
+if __name__ == "__main__":
+    main()
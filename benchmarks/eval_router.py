@@ -0,0 +1,100 @@
+"""Misrouting rate and token budget of the embedding router versus the old keyword rules.
+
+Routes every question of a labelled JSONL file ({"question": ..., "route":
+...} per line, routes factual/general/summarize/generate) with the
+nearest-centroid router and with the substring keyword lists it replaced,
+and reports accuracy, a confusion matrix, how often each sends a question
+to a more or less expensive route than its label, and the average context
+plus num_predict token budget per question.
+
+    python benchmarks/eval_router.py --queries benchmarks/router_queries.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTE_ORDER = ("factual", "general", "summarize", "generate")
+# Relative cost of a route, for telling over-budget from under-budget misroutes
+ROUTE_COST = {"factual": 0, "general": 1, "summarize": 2, "generate": 2}
+
+
+def keyword_route(question):
+    """The substring rules prepare_answer used before the router"""
+    query_lower = question.lower()
+    is_summary = any(kw in query_lower for kw in ['summarize', 'summary', 'overview', 'brief', 'recap'])
+    is_generate = any(kw in query_lower for kw in ['generate', 'create', 'make', 'write', 'compose', 'develop'])
+    is_specific = any(kw in query_lower for kw in ['chapter', 'lesson', 'unit', 'section'])
+    if is_generate:
+        return "generate"
+    if is_summary or is_specific:
+        return "summarize"
+    return "general"
+
+
+def route_budget(app, route):
+    """Context tokens plus num_predict allowed for a route"""
+    context = {
+        "factual": app.FACTUAL_CONTEXT_TOKENS,
+        "general": app.GENERAL_CONTEXT_TOKENS,
+    }.get(route, app.SUMMARY_CONTEXT_TOKENS)
+    return context + app.ROUTE_NUM_PREDICT[route]
+
+
+def evaluate(name, labels, predictions, app):
+    total = len(labels)
+    wrong = [(label, predicted) for label, predicted in zip(labels, predictions) if label != predicted]
+    over = sum(ROUTE_COST[predicted] > ROUTE_COST[label] for label, predicted in wrong)
+    under = sum(ROUTE_COST[predicted] < ROUTE_COST[label] for label, predicted in wrong)
+    budget = sum(route_budget(app, route) for route in predictions) / total
+    print(f"\n{name}: {len(wrong) / total:.1%} misrouted ({over} to a costlier route, {under} to a cheaper one), "
+          f"{budget:.0f} budget tokens per question")
+    print(f"{'label/routed':>16}" + "".join(f"{route:>11}" for route in ROUTE_ORDER))
+    for label in ROUTE_ORDER:
+        counts = [sum(1 for l, p in zip(labels, predictions) if l == label and p == route) for route in ROUTE_ORDER]
+        print(f"{label:>16}" + "".join(f"{count:>11}" for count in counts))
+    return budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", default=os.path.join(ROOT, "benchmarks", "router_queries.jsonl"))
+    parser.add_argument("--show-errors", action="store_true", help="print the questions either router gets wrong")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    os.chdir(ROOT)
+    import app
+
+    questions = [query["question"] for query in queries]
+    labels = [query["route"] for query in queries]
+    app.query_router.centroids()
+    embeddings = app.embedding_model.embed_documents(questions)
+    start = time.perf_counter()
+    routed = [app.query_router.route(embedding) for embedding in embeddings]
+    route_us = (time.perf_counter() - start) / len(questions) * 1e6
+    keywords = [keyword_route(question) for question in questions]
+
+    print(f"{len(queries)} labelled questions, router examples: {app.query_router.stats()['examples']}")
+    keyword_budget = evaluate("keyword rules", labels, keywords, app)
+    router_budget = evaluate("embedding router", labels, routed, app)
+    label_budget = sum(route_budget(app, route) for route in labels) / len(labels)
+    print(f"\nBudget per question: {keyword_budget:.0f} (keywords) -> {router_budget:.0f} (router), "
+          f"{label_budget:.0f} if every label were followed; {1 - router_budget / keyword_budget:.1%} saved")
+    print(f"Routing: {route_us:.1f} us per question on top of the query embedding")
+
+    if args.show_errors:
+        print()
+        for question, label, keyword, route in zip(questions, labels, keywords, routed):
+            if label != route or label != keyword:
+                print(f"{label:>10} keywords={keyword:<10} router={route:<10} {question}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Stand-in Ollama server for offline benchmarks.
+
+Answers POST /api/generate the way Ollama does, streamed as NDJSON or as one
+JSON message, without running a model. Each generation waits `prefill_ms`
+per prompt token (estimated at 4 characters per token) and then `token_ms`
+per generated token, and only `parallel` generations run at once, like
+OLLAMA_NUM_PARALLEL on a CPU host. The reported token counts and durations
+follow Ollama's response fields, so the app's timing breakdown still works.
+
+    python benchmarks/fake_ollama.py --port 11434 --token-ms 20 --tokens 60
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER_WORDS = (
+    "Plants need water, sunlight and air to grow. Their roots take water from the soil "
+    "and the leaves make food using light from the sun."
+).split()
+
+
+class FakeOllama:
+    """Threaded HTTP server imitating Ollama's /api/generate with fixed latencies"""
+
+    def __init__(self, token_ms=20.0, prefill_ms=0.5, load_ms=0.0, tokens=60, parallel=1):
+        self.token_ms = token_ms
+        self.prefill_ms = prefill_ms
+        self.load_ms = load_ms
+        self.tokens = tokens
+        self._slots = threading.Semaphore(parallel)
+        self.parallel = parallel
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.streamed = 0
+        self.generated_tokens = 0
+        self._server = None
+        self._thread = None
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve on a background thread and return the /api/generate URL"""
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return f"http://{host}:{self._server.server_port}/api/generate"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def generate(self, payload):
+        """Yield (token, final message or None) after sleeping like a model would"""
+        if "prompt" not in payload:
+            # A request without a prompt only loads the model
+            yield "", {"model": payload.get("model", "fake"), "done": True, "done_reason": "load"}
+            return
+        prompt_tokens = max(1, len(payload.get("prompt", "")) // 4)
+        num_predict = payload.get("options", {}).get("num_predict") or self.tokens
+        eval_count = max(1, min(self.tokens, num_predict))
+        with self._slots:
+            start = time.perf_counter()
+            time.sleep((self.load_ms + prompt_tokens * self.prefill_ms) / 1000)
+            prompt_done = time.perf_counter()
+            for i in range(eval_count):
+                time.sleep(self.token_ms / 1000)
+                word = ANSWER_WORDS[i % len(ANSWER_WORDS)]
+                yield (word if i == 0 else f" {word}"), None
+            end = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            self.streamed += bool(payload.get("stream", True))
+            self.generated_tokens += eval_count
+        yield "", {
+            "model": payload.get("model", "fake"),
+            "done": True,
+            "total_duration": int((end - start) * 1e9),
+            "load_duration": int(self.load_ms * 1e6),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int((prompt_done - start) * 1e9 - self.load_ms * 1e6),
+            "eval_count": eval_count,
+            "eval_duration": int((end - prompt_done) * 1e9),
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if payload.get("stream", True):
+                    self._stream(payload)
+                else:
+                    answer = []
+                    for token, final in fake.generate(payload):
+                        answer.append(token)
+                    body = json.dumps({**final, "response": "".join(answer)}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def _stream(self, payload):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token, final in fake.generate(payload):
+                        message = final or {"model": payload.get("model", "fake"), "response": token, "done": False}
+                        line = json.dumps(message).encode("utf-8") + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def stats(self):
+        with self._lock:
+            return {
+                "token_ms": self.token_ms,
+                "prefill_ms": self.prefill_ms,
+                "load_ms": self.load_ms,
+                "tokens": self.tokens,
+                "parallel": self.parallel,
+                "requests": self.requests,
+                "streamed": self.streamed,
+                "generated_tokens": self.generated_tokens,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-ms", type=float, default=20.0, help="delay per generated token")
+    parser.add_argument("--prefill-ms", type=float, default=0.5, help="delay per prompt token")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="fixed delay per request (model load)")
+    parser.add_argument("--tokens", type=int, default=60, help="answer length, capped by num_predict")
+    parser.add_argument("--parallel", type=int, default=1, help="generations served at once")
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.token_ms, args.prefill_ms, args.load_ms, args.tokens, args.parallel)
+    url = fake.start(args.host, args.port)
+    print(f"Fake Ollama listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
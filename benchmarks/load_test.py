@@ -0,0 +1,85 @@
+"""Throughput of /api/ask under concurrent students.
+
+Sends questions to a running backend from 1, 10 and 50 concurrent clients
+(configurable) and reports requests/sec and latency percentiles per level.
+Start the server first, e.g. `python serve.py`, and point it at a real or
+stand-in Ollama.
+
+    python benchmarks/load_test.py --url http://localhost:5000/api --concurrency 1 10 50
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUESTIONS = [
+    "What do plants need to grow?",
+    "Why do we need clean water?",
+    "How many sides does a triangle have?",
+    "What is a noun?",
+    "How do birds build their nests?",
+    "What are the seasons of the year?",
+    "How do we measure length?",
+    "Why should we wash our hands?",
+]
+
+
+def ask(session, url, payload):
+    start = time.perf_counter()
+    response = session.post(f"{url}/ask", json=payload, timeout=300)
+    return time.perf_counter() - start, response.status_code
+
+
+def run_level(url, concurrency, requests_per_client, class_name, subject, unique):
+    payloads = []
+    for i in range(concurrency * requests_per_client):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        if unique:
+            # Defeat the answer cache so every request reaches the model
+            question = f"{question} (student {i})"
+        payloads.append({"question": question, "class": class_name, "subject": subject})
+
+    sessions = [requests.Session() for _ in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda item: ask(sessions[item[0] % concurrency], url, item[1]), enumerate(payloads)))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in results])
+    statuses = [status for _, status in results]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": statuses.count(200),
+        "rejected": statuses.count(503),
+        "throughput": len(results) / elapsed,
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000/api")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--class", dest="class_name", default="Class 3")
+    parser.add_argument("--subject", default="EVS")
+    parser.add_argument("--cached", action="store_true", help="repeat identical questions (answer cache hits)")
+    args = parser.parse_args()
+
+    select = requests.post(f"{args.url}/select", json={"class": args.class_name, "subject": args.subject}, timeout=600)
+    print(select.json()["message"])
+
+    print(f"{'clients':>8} {'requests':>9} {'ok':>5} {'503':>5} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for concurrency in args.concurrency:
+        result = run_level(args.url, concurrency, args.requests_per_client,
+                           args.class_name, args.subject, unique=not args.cached)
+        print(f"{result['concurrency']:>8} {result['requests']:>9} {result['ok']:>5} {result['rejected']:>5} "
+              f"{result['throughput']:>8.2f} {result['p50']:>8.2f} {result['p95']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
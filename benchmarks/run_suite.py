@@ -0,0 +1,367 @@
+"""Offline end-to-end benchmark suite with JSON results for comparing commits.
+
+Generates synthetic syllabus zips of several sizes in a temporary directory
+and starts a stand-in Ollama server (fake_ollama.py) with a fixed per-token
+latency. For each corpus size it measures ingestion time and memory (cold
+and from the on-disk cache), retrieval latency, and /api/select + /api/ask
+throughput at each concurrency level, through the Flask test client or over
+HTTP with --http (an in-process waitress server). Uses the real embedding
+model but needs neither Ollama nor network access. Ingestion memory is the
+backend process's resident size; the PDF worker processes are not counted.
+
+    python benchmarks/run_suite.py --pdfs 2 8 32 --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/run_suite.py --compare results/before.json results/after.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_ollama import FakeOllama
+from load_test import QUESTIONS
+from synthetic import WORDS, make_syllabus_zip
+
+SUITE_VERSION = 1
+
+
+def git_revision():
+    """(commit hash, whether the tree has uncommitted changes), or (None, None) outside git"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.stdout.strip(), bool(status.stdout.strip())
+
+
+def rss_bytes():
+    """Resident memory of this process, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def percentiles_ms(seconds):
+    values = np.asarray(seconds) * 1000
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+    }
+
+
+def make_questions(count, seed=0):
+    """Student-style questions: the load test's plus generated keyword questions"""
+    rng = np.random.default_rng(seed)
+    questions = list(QUESTIONS)
+    while len(questions) < count:
+        words = rng.choice(WORDS, size=3, replace=False)
+        questions.append(f"What does the book say about {words[0]} and {words[1]} near the {words[2]}?")
+    return questions[:count]
+
+
+class TestClientTransport:
+    """Requests through Flask's test client, one client per worker thread"""
+
+    name = "test_client"
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+
+    def session(self):
+        return self.flask_app.test_client()
+
+    def post(self, session, path, payload):
+        response = session.post(f"/api{path}", json=payload)
+        return response.status_code, response.get_json()
+
+
+class HTTPTransport:
+    """Requests over HTTP to a waitress server started in this process"""
+
+    name = "http"
+
+    def __init__(self, flask_app, threads):
+        from waitress.server import create_server
+
+        self.server = create_server(flask_app, host="127.0.0.1", port=0, threads=threads,
+                                    send_bytes=1, channel_timeout=300)
+        self.url = f"http://127.0.0.1:{self.server.effective_port}/api"
+        self.thread = threading.Thread(target=self.server.run, name="waitress", daemon=True)
+        self.thread.start()
+
+    def session(self):
+        return requests.Session()
+
+    def post(self, session, path, payload):
+        response = session.post(f"{self.url}{path}", json=payload, timeout=300)
+        return response.status_code, response.json()
+
+    def close(self):
+        self.server.close()
+
+
+def bench_ingestion(app, class_name, subject):
+    """Cold load (empty cache) then a reload from the on-disk cache"""
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    corpus = app.syllabus_registry.get(class_name, subject)
+    cold = time.perf_counter() - start
+    rss_after = rss_bytes()
+
+    app.syllabus_registry.invalidate(class_name, subject)
+    start = time.perf_counter()
+    corpus = app.syllabus_registry.get(class_name, subject)
+    cached = time.perf_counter() - start
+    return corpus, {
+        "cold_seconds": cold,
+        "cached_seconds": cached,
+        "chunks_per_second": len(corpus.chunks) / cold if cold else 0.0,
+        "corpus_bytes": corpus.memory_bytes,
+        "rss_growth_bytes": rss_after - rss_before if rss_before is not None else None,
+    }
+
+
+def bench_retrieval(app, corpus, questions, embeddings):
+    """Per-query dense/hybrid search and full retrieve_context latency, embedding excluded"""
+    searches, contexts = [], []
+    for question, embedding in zip(questions, embeddings):
+        start = time.perf_counter()
+        app.search_chunks(corpus, question, embedding, app.GENERAL_TOP_K)
+        searches.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        app.retrieve_context(corpus, question, app.GENERAL_TOP_K, embedding, app.GENERAL_CONTEXT_TOKENS)
+        contexts.append(time.perf_counter() - start)
+    return {
+        "queries": len(questions),
+        "hybrid": app.HYBRID_RETRIEVAL,
+        "index": type(corpus.index).__name__,
+        "search": percentiles_ms(searches),
+        "retrieve_context": percentiles_ms(contexts),
+    }
+
+
+def bench_end_to_end(transport, class_name, subject, questions, concurrency, requests_per_client):
+    """Select the syllabus on every client, then ask from `concurrency` clients at once"""
+    sessions = [transport.session() for _ in range(concurrency)]
+    select_times = []
+    for session in sessions:
+        start = time.perf_counter()
+        status, body = transport.post(session, "/select", {"class": class_name, "subject": subject})
+        select_times.append(time.perf_counter() - start)
+        if status != 200 or body.get("status") != "success":
+            raise RuntimeError(f"/select failed: {status} {body}")
+
+    total = concurrency * requests_per_client
+    payloads = [
+        {"question": questions[i % len(questions)], "class": class_name, "subject": subject}
+        for i in range(total)
+    ]
+
+    def ask(item):
+        i, payload = item
+        start = time.perf_counter()
+        status, _ = transport.post(sessions[i % concurrency], "/ask", payload)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(ask, enumerate(payloads)))
+    elapsed = time.perf_counter() - start
+
+    statuses = [status for _, status in results]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": statuses.count(200),
+        "rejected": statuses.count(503),
+        "qps": total / elapsed,
+        "select": percentiles_ms(select_times),
+        "ask": percentiles_ms([latency for latency, _ in results]),
+    }
+
+
+def run(args):
+    commit, dirty = git_revision()
+    results = {
+        "suite_version": SUITE_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "started": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "sizes": [],
+    }
+
+    fake = FakeOllama(args.token_ms, args.prefill_ms, 0.0, args.tokens, args.ollama_parallel)
+    ollama_url = fake.start()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            import_start = time.perf_counter()
+            import app
+            results["import_seconds"] = time.perf_counter() - import_start
+            warmup_start = time.perf_counter()
+            app.warmup.start()
+            app.warmup.wait()
+            results["warmup_seconds"] = time.perf_counter() - warmup_start
+            app.ollama_client.api_url = ollama_url
+            if not args.cached:
+                # Similarity never exceeds 1, so every question reaches the model
+                app.answer_cache.threshold = 1.01
+                app.COALESCE_REQUESTS = False
+
+            class_name = next(iter(app.AVAILABLE_CLASSES))
+            folder = os.path.join("datasets", app.AVAILABLE_CLASSES[class_name])
+            os.makedirs(folder)
+
+            questions = make_questions(args.queries)
+            embeddings = [app.query_batcher.embed(question) for question in questions]
+            if args.http:
+                transport = HTTPTransport(app.app, max(max(args.concurrency), 4))
+            else:
+                transport = TestClientTransport(app.app)
+
+            for size, pdfs in enumerate(args.pdfs):
+                subject = f"suite{size}x{pdfs}"
+                # Requests may only name listed subjects
+                app.AVAILABLE_SUBJECTS[subject] = subject
+                pages = make_syllabus_zip(os.path.join(folder, f"{subject}_books.zip"), pdfs=pdfs, pages=args.pages,
+                                          words_per_page=args.words_per_page, seed=size, prefix=f"{subject}_book")
+                print(f"\n=== {pdfs} PDFs x {args.pages} pages ===")
+                corpus, ingestion = bench_ingestion(app, class_name, subject)
+                entry = {"pdfs": pdfs, "pages": pages, "chunks": len(corpus.chunks), "ingestion": ingestion}
+                entry["retrieval"] = bench_retrieval(app, corpus, questions, embeddings)
+                entry["end_to_end"] = [
+                    bench_end_to_end(transport, class_name, subject, questions, concurrency, args.requests_per_client)
+                    for concurrency in args.concurrency
+                ]
+                results["sizes"].append(entry)
+
+            if args.http:
+                transport.close()
+            results["transport"] = transport.name
+            results["fake_ollama"] = fake.stats()
+            results["stages"] = app.metrics.summary()
+            results["process_rss_bytes"] = rss_bytes()
+        finally:
+            fake.stop()
+            os.chdir(cwd)
+    return results
+
+
+def print_report(results):
+    print()
+    print(f"commit {results['commit'] or 'unknown'}{' (dirty)' if results['dirty'] else ''}, "
+          f"transport {results['transport']}, {results['cpu_count']} CPUs")
+    print(f"{'pdfs':>5} {'chunks':>7} {'cold s':>8} {'cached s':>9} {'corpus MB':>10} "
+          f"{'search p95':>11} {'context p95':>12} {'conc':>5} {'QPS':>7} {'ask p50':>9} {'ask p95':>9}")
+    for entry in results["sizes"]:
+        ingestion, retrieval = entry["ingestion"], entry["retrieval"]
+        for i, level in enumerate(entry["end_to_end"]):
+            prefix = (
+                f"{entry['pdfs']:>5} {entry['chunks']:>7} {ingestion['cold_seconds']:>8.2f} "
+                f"{ingestion['cached_seconds']:>9.2f} {ingestion['corpus_bytes'] / 1e6:>10.1f} "
+                f"{retrieval['search']['p95_ms']:>9.2f}ms {retrieval['retrieve_context']['p95_ms']:>10.2f}ms"
+            ) if i == 0 else " " * 70
+            print(f"{prefix} {level['concurrency']:>5} {level['qps']:>7.1f} "
+                  f"{level['ask']['p50_ms']:>7.0f}ms {level['ask']['p95_ms']:>7.0f}ms")
+
+
+def flatten(value, prefix=""):
+    """{"sizes.0.ingestion.cold_seconds": 1.2, ...} for the numeric leaves of a result"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def keyed_sizes(results):
+    """Per-size results keyed by PDF count and concurrency, so runs with other sweeps still line up"""
+    return {
+        f"pdfs={entry['pdfs']}": {
+            **entry,
+            "end_to_end": {f"concurrency={level['concurrency']}": level for level in entry["end_to_end"]},
+        }
+        for entry in results.get("sizes", [])
+    }
+
+
+def compare(before_path, after_path):
+    """Print the relative change of every measurement present in both result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before.get('commit') or before_path} -> {after.get('commit') or after_path}")
+    if before.get("config") != after.get("config"):
+        print("warning: the runs used different settings")
+    old, new = flatten(keyed_sizes(before)), flatten(keyed_sizes(after))
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == new[key]:
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "new"
+        print(f"{key:<55} {old[key]:>12.4g} {new[key]:>12.4g} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdfs", type=int, nargs="+", default=[2, 8, 32], help="PDFs per generated syllabus")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--words-per-page", type=int, default=350)
+    parser.add_argument("--queries", type=int, default=64, help="questions for the retrieval benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--token-ms", type=float, default=20.0, help="fake Ollama delay per generated token")
+    parser.add_argument("--prefill-ms", type=float, default=0.5, help="fake Ollama delay per prompt token")
+    parser.add_argument("--tokens", type=int, default=60, help="fake Ollama answer length")
+    parser.add_argument("--ollama-parallel", type=int, default=2, help="generations the fake Ollama runs at once")
+    parser.add_argument("--http", action="store_true", help="send requests over HTTP instead of the test client")
+    parser.add_argument("--cached", action="store_true", help="keep the answer cache and request coalescing enabled")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(args)
+    print_report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
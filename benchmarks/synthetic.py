@@ -0,0 +1,50 @@
+"""Synthetic syllabus data for the benchmarks"""
+import random
+import zipfile
+
+import fitz
+
+WORDS = (
+    "plant leaf root stem flower seed water sun light air soil animal bird fish "
+    "insect river mountain forest village city family friend school teacher "
+    "number add subtract multiply divide shape circle square triangle measure "
+    "length weight time money story poem letter word sentence read write "
+    "food health clean safety weather rain cloud season map direction travel"
+).split()
+
+
+def page_text(rng, words_per_page):
+    words = [rng.choice(WORDS) for _ in range(words_per_page)]
+    for i in range(12, len(words), 12):
+        words[i] = words[i] + "."
+    return " ".join(words)
+
+
+def noise_image(rng, width, height):
+    """PNG of random pixels, which does not compress, standing in for a page scan"""
+    pixmap = fitz.Pixmap(fitz.csRGB, width, height, rng.randbytes(width * height * 3), False)
+    return pixmap.tobytes("png")
+
+
+def make_pdf(rng, pages, words_per_page, title, image_size=None):
+    """PDF bytes; with image_size=(width, height) every page also gets a scan-like image"""
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        if image_size is not None:
+            page.insert_image(fitz.Rect(0, 0, 595, 842), stream=noise_image(rng, *image_size), overlay=False)
+        text = f"{title} page {page_no + 1}. " + page_text(rng, words_per_page)
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_syllabus_zip(path, pdfs=4, pages=20, words_per_page=350, seed=0, prefix="book", image_size=None):
+    """Write a zip of `pdfs` generated PDFs and return the number of pages written"""
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i in range(pdfs):
+            title = f"{prefix} {i + 1}"
+            zf.writestr(f"{prefix}_{i + 1}.pdf", make_pdf(rng, pages, words_per_page, title, image_size))
+    return pdfs * pages
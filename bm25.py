@@ -0,0 +1,104 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have he her his how i in is it its of on or "
+    "she that the their them they this to was we were what when where which who why "
+    "will with you your".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index stored as flat postings arrays.
+
+    Postings are kept CSR-style: for term id t, `doc_ids[indptr[t]:indptr[t + 1]]`
+    are the chunks containing it and `term_freqs` the matching counts.
+    """
+
+    def __init__(self, vocabulary, indptr, doc_ids, term_freqs, doc_lengths, k1=1.5, b=0.75):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        n_docs = len(doc_lengths)
+        doc_freqs = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if n_docs else 0.0
+        # Per-document part of the BM25 denominator, computed once
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / max(average_length, 1.0))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts, k1=1.5, b=0.75):
+        vocabulary = {}
+        term_ids, doc_ids, term_freqs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)))
+        return cls(
+            vocabulary,
+            indptr,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.minimum(np.asarray(term_freqs, dtype=np.int64)[order], np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_lengths,
+            k1,
+            b,
+        )
+
+    def scores(self, query):
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+        return scores
+
+    def search(self, query, k):
+        """Top-k chunks by BM25, best first; chunks without any query term are left out"""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, matched.size)
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return best.astype(np.int64), scores[best]
+
+    @property
+    def nbytes(self):
+        arrays = (self.indptr, self.doc_ids, self.term_freqs, self.doc_lengths, self.idf, self.length_norm)
+        # Rough size of the vocabulary dict: key string plus entry overhead
+        vocabulary_bytes = sum(len(term) + 100 for term in self.vocabulary)
+        return int(sum(array.nbytes for array in arrays)) + vocabulary_bytes
+
+
+def reciprocal_rank_fusion(rankings, k, constant=60):
+    """Fuse ranked id lists: each id scores sum(1 / (constant + rank)); returns the top k ids"""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[int(doc_id)] = fused.get(int(doc_id), 0.0) + 1.0 / (constant + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
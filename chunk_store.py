@@ -0,0 +1,134 @@
+"""Compact in-memory storage for the chunk texts of a syllabus.
+
+Instead of one str object (plus a Document and a metadata dict) per chunk,
+all chunk texts are kept in one UTF-8 buffer and located by offset/length
+arrays. The PDF each chunk came from is a small integer into a table of
+PDF names, and its position within that PDF and the page it starts on are
+other integer arrays.
+LangChain Documents are only built on request, for code that needs them.
+"""
+from collections.abc import Sequence
+
+import numpy as np
+
+
+class ChunkStore(Sequence):
+    """Chunk texts of a syllabus in row order; `store[i]` is the text of chunk i.
+
+    Rows line up with the embeddings matrix: PDFs appear in the order they
+    were added and each PDF's chunks are consecutive.
+    """
+
+    __slots__ = ("_arena", "offsets", "lengths", "source_ids", "chunk_numbers", "pages", "sources", "pdf_rows")
+
+    def __init__(self, arena, offsets, lengths, source_ids, chunk_numbers, pages, sources, pdf_rows):
+        self._arena = arena
+        self.offsets = offsets
+        self.lengths = lengths
+        self.source_ids = source_ids
+        self.chunk_numbers = chunk_numbers
+        # 1-based page each chunk starts on, 0 when unknown
+        self.pages = pages
+        self.sources = sources
+        # pdf_name -> (first, last) rows of its chunks
+        self.pdf_rows = pdf_rows
+
+    @classmethod
+    def build(cls, pdfs):
+        """Store from (pdf_name, [chunk texts]) or (pdf_name, [chunk texts], [chunk pages]), in row order"""
+        parts = []
+        lengths, source_ids, chunk_numbers, pages = [], [], [], []
+        sources, source_index, pdf_rows = [], {}, {}
+        for pdf_name, texts, *rest in pdfs:
+            chunk_pages = rest[0] if rest else None
+            if pdf_name not in source_index:
+                source_index[pdf_name] = len(sources)
+                sources.append(pdf_name)
+            pdf_rows[pdf_name] = (len(lengths), len(lengths) + len(texts))
+            for number, text in enumerate(texts):
+                encoded = text.encode("utf-8")
+                parts.append(encoded)
+                lengths.append(len(encoded))
+                source_ids.append(source_index[pdf_name])
+                chunk_numbers.append(number)
+            pages.extend(chunk_pages or [0] * len(texts))
+
+        lengths = np.asarray(lengths, dtype=np.uint32)
+        offsets = np.zeros(len(lengths), dtype=np.int64)
+        if len(lengths):
+            np.cumsum(lengths[:-1], out=offsets[1:])
+        source_dtype = np.uint16 if len(sources) <= np.iinfo(np.uint16).max else np.uint32
+        return cls(
+            b"".join(parts),
+            offsets,
+            lengths,
+            np.asarray(source_ids, dtype=source_dtype),
+            np.asarray(chunk_numbers, dtype=np.uint32),
+            np.asarray(pages, dtype=np.uint32),
+            tuple(sources),
+            pdf_rows,
+        )
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        start = int(self.offsets[row])
+        return self._arena[start:start + int(self.lengths[row])].decode("utf-8")
+
+    def __iter__(self):
+        arena = self._arena
+        for start, length in zip(self.offsets.tolist(), self.lengths.tolist()):
+            yield arena[start:start + length].decode("utf-8")
+
+    def source(self, row):
+        return self.sources[self.source_ids[row]]
+
+    def page(self, row):
+        """Page the chunk starts on, or None when unknown"""
+        return int(self.pages[row]) or None
+
+    def chunk(self, row):
+        """(pdf name, chunk number within the PDF, text), the shape context_builder takes"""
+        return self.source(row), int(self.chunk_numbers[row]), self[row]
+
+    def pdf_texts(self, pdf_name):
+        first, last = self.pdf_rows[pdf_name]
+        return self[first:last]
+
+    def document(self, row):
+        """LangChain Document for one chunk, with the metadata the app used to attach"""
+        from langchain.schema import Document
+
+        source, number, text = self.chunk(row)
+        return Document(page_content=text, metadata={"source": source, "chunk": number, "page": self.page(row)})
+
+    @property
+    def documents(self):
+        """Lazy sequence of LangChain Documents over all chunks"""
+        return LazyDocuments(self)
+
+    @property
+    def nbytes(self):
+        arrays = (self.offsets, self.lengths, self.source_ids, self.chunk_numbers, self.pages)
+        names = sum(len(name) + 50 for name in self.sources)
+        return len(self._arena) + int(sum(array.nbytes for array in arrays)) + names
+
+
+class LazyDocuments(Sequence):
+    """Documents built on access from a ChunkStore, for LangChain-facing code"""
+
+    __slots__ = ("store",)
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.store.document(i) for i in range(*row.indices(len(self.store)))]
+        return self.store.document(row)
@@ -0,0 +1,115 @@
+"""Token-budgeted prompt context from retrieved chunks.
+
+The splitter makes neighbouring chunks of a PDF share up to CHUNK_OVERLAP
+characters, so joining retrieved chunks as-is repeats text in the prompt.
+Chunks are taken best first until the token budget is spent, then adjacent
+chunks of the same PDF are stitched back together with the shared text
+removed.
+"""
+import threading
+
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Counts tokens with a Hugging Face tokenizer, or estimates them from length.
+
+    The tokenizer is loaded on first use; if `transformers` or the tokenizer
+    files are not available, a characters-per-token estimate is used instead.
+    """
+
+    def __init__(self, tokenizer_name=None):
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return self._tokenizer
+            if self.tokenizer_name:
+                try:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                    print(f"Counting prompt tokens with the {self.tokenizer_name} tokenizer")
+                except Exception as e:
+                    print(f"Tokenizer {self.tokenizer_name} unavailable ({e}); estimating {CHARS_PER_TOKEN} characters per token")
+            self._loaded = True
+            return self._tokenizer
+
+    def count(self, text):
+        tokenizer = self._load()
+        if tokenizer is None:
+            return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text, max_tokens):
+        """Longest prefix of `text` within max_tokens, cut at a word boundary"""
+        if self.count(text) <= max_tokens:
+            return text
+        tokenizer = self._load()
+        if tokenizer is None:
+            text = text[:max_tokens * CHARS_PER_TOKEN]
+        else:
+            text = tokenizer.decode(tokenizer.encode(text, add_special_tokens=False)[:max_tokens])
+        cut = text.rfind(" ")
+        return text[:cut] if cut > 0 else text
+
+
+def overlap_length(previous, following, max_overlap):
+    """Length of the longest suffix of `previous` that starts `following`.
+
+    Only suffixes starting at a word boundary count, so a chunk that merely
+    begins with the last letters of the previous one is not clipped.
+    """
+    for length in range(min(max_overlap, len(previous), len(following)), 0, -1):
+        at_boundary = length == len(previous) or not previous[-length - 1].isalnum()
+        if at_boundary and previous.endswith(following[:length]):
+            return length
+    return 0
+
+
+def merge_passages(chunks, max_overlap):
+    """Stitch chunks into passages.
+
+    `chunks` is a list of (source, chunk_index, text) in any order; runs of
+    consecutive chunk indices from the same source become one passage with
+    the overlapping text kept once. Returns passages as (source, [chunk
+    indices], text), in the order their first chunk appears in `chunks`.
+    """
+    first_seen = {(source, index): rank for rank, (source, index, _) in enumerate(chunks)}
+    passages = []
+    for source, index, text in sorted(chunks, key=lambda chunk: (chunk[0], chunk[1])):
+        if passages and passages[-1][0] == source and passages[-1][1][-1] == index - 1:
+            _, indices, merged = passages[-1]
+            shared = overlap_length(merged, text, max_overlap)
+            separator = "" if shared else " "
+            passages[-1] = (source, indices + [index], merged + separator + text[shared:])
+        else:
+            passages.append((source, [index], text))
+    passages.sort(key=lambda passage: min(first_seen[(passage[0], index)] for index in passage[1]))
+    return passages
+
+
+def build_context(chunks, token_budget, counter, max_overlap, separator="\n"):
+    """Pack chunks (best first) into a context of at most token_budget tokens.
+
+    Returns (context, positions of the chunks used, context token count). The
+    best chunk is always included, truncated if it alone exceeds the budget.
+    """
+    used = []
+    context = ""
+    tokens = 0
+    for position in range(len(chunks)):
+        candidate = used + [position]
+        passages = merge_passages([chunks[i] for i in candidate], max_overlap)
+        text = separator.join(passage[2] for passage in passages)
+        text_tokens = counter.count(text)
+        if text_tokens > token_budget:
+            if not used:
+                context = counter.truncate(text, token_budget)
+                return context, candidate, counter.count(context)
+            break
+        used, context, tokens = candidate, text, text_tokens
+    return context, used, tokens
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+CACHE_DIR = "syllabus_cache"
+# 2: chunks are split page by page and record their page numbers
+CACHE_VERSION = 2
+
+_hash_memo = {}
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Content hash of a file, memoized on (path, size, mtime)"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def pdf_hashes(zip_path, block_size=1 << 20):
+    """{pdf_name: content hash} for the PDFs of a zip, in zip order"""
+    hashes = {}
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        for info in zf.infolist():
+            if not info.filename.endswith(".pdf"):
+                continue
+            digest = hashlib.sha256()
+            with zf.open(info) as pdf_file:
+                for block in iter(lambda: pdf_file.read(block_size), b""):
+                    digest.update(block)
+            hashes[info.filename] = digest.hexdigest()
+    return hashes
+
+
+def settings_hash(settings):
+    """Hash of the settings that shape chunks and vectors, recorded with each manifest record"""
+    payload = json.dumps({"settings": settings, "version": CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_key(zip_path, settings):
+    """Key a zip by its content hash plus the settings that shaped its chunks"""
+    payload = json.dumps(
+        {"zip": file_sha256(zip_path), "settings": settings, "version": CACHE_VERSION},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def index_key(zip_keys, kind, params):
+    """Key a vector index by the zips it covers (in order) and how it was built"""
+    payload = json.dumps(
+        {"zips": list(zip_keys), "kind": kind, "params": params, "version": CACHE_VERSION},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def index_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, "indexes", key)
+
+
+def entry_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def load_entry(key, cache_dir=CACHE_DIR):
+    """Return ({pdf_name: (chunks, chunk pages)}, embeddings) for a cached zip, or None on a miss.
+
+    Embeddings are memory-mapped read-only, so nothing is parsed or embedded.
+    """
+    path = entry_path(key, cache_dir)
+    chunks_path = os.path.join(path, "chunks.json")
+    vectors_path = os.path.join(path, "embeddings.npy")
+    if not (os.path.exists(chunks_path) and os.path.exists(vectors_path)):
+        return None
+
+    try:
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        embeddings = np.load(vectors_path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        print(f" Ignoring unreadable cache entry {key}: {e}")
+        return None
+
+    pdf_chunks = {pdf["name"]: (pdf["chunks"], pdf["pages"]) for pdf in data["pdfs"]}
+    total = sum(len(chunks) for chunks, _ in pdf_chunks.values())
+    if embeddings.shape[0] != total:
+        print(f" Ignoring inconsistent cache entry {key}")
+        return None
+    return pdf_chunks, embeddings
+
+
+def save_entry(key, pdf_chunks, embeddings, source=None, cache_dir=CACHE_DIR):
+    """Write an entry atomically so a crashed write never looks like a hit"""
+    path = entry_path(key, cache_dir)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        with open(os.path.join(tmp_path, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "source": source,
+                    "pdfs": [
+                        {"name": name, "chunks": chunks, "pages": pages} for name, (chunks, pages) in pdf_chunks.items()
+                    ],
+                },
+                f,
+            )
+        np.save(os.path.join(tmp_path, "embeddings.npy"), np.asarray(embeddings, dtype=np.float32))
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        print(f" Could not write cache entry {key}: {e}")
+
+
+def remove_entry(key, cache_dir=CACHE_DIR):
+    shutil.rmtree(entry_path(key, cache_dir), ignore_errors=True)
+
+
+class Manifest:
+    """Which cache entry holds each processed zip, and the PDFs it was built from.
+
+    Records are keyed by zip path and hold the zip's size and mtime (so an
+    unchanged zip is recognized without hashing it), its cache entry key and
+    its PDFs in order with their content hashes and chunk counts, which lets a
+    changed zip reuse the rows of PDFs that did not change. They also hold a
+    hash of the settings the entry was built with, since the size and mtime
+    say nothing about those.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = None
+
+    def _load(self):
+        if self._records is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._records = data["zips"] if data.get("version") == CACHE_VERSION else {}
+            except (OSError, ValueError, KeyError):
+                self._records = {}
+        return self._records
+
+    def get(self, zip_path):
+        with self._lock:
+            return self._load().get(os.path.abspath(zip_path))
+
+    def built_with(self, record, settings):
+        """True when the record's entry was built with these settings"""
+        return record.get("settings") == settings_hash(settings)
+
+    def is_current(self, zip_path, record, settings):
+        """True when the zip still has the size and mtime the record was made from, and the same settings"""
+        stat = os.stat(zip_path)
+        return (record["mtime_ns"] == stat.st_mtime_ns and record["size"] == stat.st_size
+                and self.built_with(record, settings))
+
+    def put(self, zip_path, key, pdfs, settings):
+        """Record a zip's entry; `pdfs` is a list of {"name", "sha256", "chunks"} in entry order"""
+        stat = os.stat(zip_path)
+        with self._lock:
+            records = self._load()
+            records[os.path.abspath(zip_path)] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "key": key,
+                "settings": settings_hash(settings),
+                "pdfs": pdfs,
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "zips": records}, f)
+            os.replace(tmp_path, self.path)
+
+    def references(self, key):
+        with self._lock:
+            return any(record["key"] == key for record in self._load().values())
+
+
+def remove_stale_indexes(manifest, cache_dir=CACHE_DIR):
+    """Delete saved vector indexes over a zip entry the manifest no longer references; returns how many.
+
+    Indexes saved without the list of zip keys they cover cannot be matched
+    and are removed too; they are rebuilt on the next load that needs them.
+    """
+    root = os.path.join(cache_dir, "indexes")
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for name in names:
+        if name.startswith(".tmp-"):
+            continue
+        path = os.path.join(root, name)
+        try:
+            with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+                zip_keys = json.load(f).get("zips")
+        except (OSError, ValueError):
+            zip_keys = None
+        if zip_keys is None or not all(manifest.references(key) for key in zip_keys):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,340 @@
+"""Parallel PDF ingestion: zip -> PDF pages -> clean -> chunks -> embeddings.
+
+PDFs (or page ranges of large PDFs) fan out to a process pool and the results
+are merged back in zip order, so the chunks are identical to a serial run.
+Embedding happens on the calling process in fixed-size batches while the
+workers keep extracting the PDFs that follow.
+
+Text is extracted one page at a time and fed through the splitter as it
+comes, so a PDF's full text is never built up in memory, and every chunk
+records the page it starts on. Large PDFs are copied out of the zip into a
+spool file and opened by path, letting MuPDF read pages from disk instead
+of holding the whole file as bytes.
+
+This module is imported by the pool workers, so it must stay free of the
+embedding model and anything else expensive to import. PyMuPDF and the text
+splitter are imported on first use, so the web app only pays for them once
+it actually ingests a zip. Spawned workers also re-import the script that
+started the server: serve.py keeps that cheap by importing app.py in main(),
+while the debug server (`python app.py`) builds the Flask app and its
+executors again in every worker, though not the embedding model, which app.py
+loads lazily.
+"""
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from bisect import bisect_right
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+EMBED_BATCH_SIZE = 64
+# PDFs bigger than this (uncompressed) are split into page ranges across workers
+LARGE_PDF_BYTES = 20 * 1024 * 1024
+PAGES_PER_TASK = 40
+# PDFs bigger than this (uncompressed) are spooled to a file instead of read into memory
+SPOOL_PDF_BYTES = int(os.environ.get("SPOOL_PDF_MB", "8")) * 1024 * 1024
+SPOOL_DIR = os.environ.get("INGEST_SPOOL_DIR") or None
+# Buffered page text is split once it holds this many chunks' worth of characters
+SPLIT_WINDOW_CHUNKS = 8
+
+_executors = {}
+_splitters = {}
+
+
+def clean_text(text):
+    text = re.sub(r"[^a-zA-Z0-9\s\.\,\;\:\?\!\-]", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def get_splitter(chunk_size, chunk_overlap):
+    key = (chunk_size, chunk_overlap)
+    if key not in _splitters:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        _splitters[key] = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+    return _splitters[key]
+
+
+def iter_pages(doc, first_page=0, last_page=None):
+    """(page number from 1, cleaned text) for each page that has text, extracted one at a time"""
+    import fitz
+    for number in range(first_page, doc.page_count if last_page is None else last_page):
+        text = clean_text(doc[number].get_text())
+        # MuPDF keeps decoded page resources (scan images) in its store; drop them page by page
+        fitz.TOOLS.store_shrink(100)
+        if text:
+            yield number + 1, text
+
+
+def split_pages(pages, chunk_size, chunk_overlap, window_chunks=SPLIT_WINDOW_CHUNKS):
+    """Yield (chunk, page number) from (page number, text) pairs.
+
+    Pages are appended to a buffer that is split whenever it holds
+    window_chunks chunks' worth of text. Chunks ending within the last
+    chunk_size characters may still grow, so they are split again with the
+    pages that follow. A chunk's page is the one its first character is on.
+    """
+    splitter = get_splitter(chunk_size, chunk_overlap)
+    buffer = ""
+    # Buffer offset at which each buffered page starts, and its page number
+    starts, numbers = [], []
+
+    def flush(final):
+        nonlocal buffer, starts, numbers
+        position, keep_from = 0, len(buffer)
+        for chunk in splitter.split_text(buffer):
+            # Chunks are stripped substrings of the buffer, in order
+            start = buffer.find(chunk, position)
+            if start < 0:
+                start = position
+            if not final and start + len(chunk) > len(buffer) - chunk_size:
+                keep_from = start
+                break
+            yield chunk, numbers[bisect_right(starts, start) - 1]
+            position = start + 1
+        first = bisect_right(starts, keep_from) - 1
+        buffer = buffer[keep_from:]
+        starts = [0] + [start - keep_from for start in starts[first + 1:]]
+        numbers = numbers[first:]
+
+    for number, text in pages:
+        if buffer:
+            buffer += " "
+        starts.append(len(buffer))
+        numbers.append(number)
+        buffer += text
+        if len(buffer) >= chunk_size * window_chunks:
+            yield from flush(final=False)
+    if buffer:
+        yield from flush(final=True)
+
+
+def spool_pdf(zf, info, spool_dir=None):
+    """Copy a zip member to a temporary .pdf file block by block and return its path"""
+    fd, path = tempfile.mkstemp(prefix="spool-", suffix=".pdf", dir=spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as out, zf.open(info) as pdf_file:
+            shutil.copyfileobj(pdf_file, out, 1 << 20)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def open_pdf(zip_path, pdf_name, path=None):
+    """Document opened from its spool file when there is one, else from the zip member's bytes"""
+    import fitz
+    if path is not None:
+        return fitz.open(path)
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        return fitz.open(stream=zf.read(pdf_name), filetype="pdf")
+
+
+def reset_peak_rss():
+    """Restart this process's resident memory high-water mark from its current size (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_bytes():
+    """Resident memory high-water mark (VmHWM) since the last reset, or None where it cannot be read"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# Pool tasks. Workers reopen the zip (or spool file) themselves so only paths cross the process boundary.
+def process_pdf(zip_path, pdf_name, path, chunk_size, chunk_overlap):
+    """(chunks, page number of each chunk, page count) of a whole PDF"""
+    doc = open_pdf(zip_path, pdf_name, path)
+    try:
+        chunks, pages = [], []
+        for chunk, page in split_pages(iter_pages(doc), chunk_size, chunk_overlap):
+            chunks.append(chunk)
+            pages.append(page)
+        return chunks, pages, doc.page_count
+    finally:
+        doc.close()
+
+
+def extract_pages(zip_path, pdf_name, path, first_page, last_page):
+    doc = open_pdf(zip_path, pdf_name, path)
+    try:
+        return list(iter_pages(doc, first_page, last_page))
+    finally:
+        doc.close()
+
+
+def split_page_list(pages, chunk_size, chunk_overlap):
+    """(chunks, page number of each chunk) from a list of (page number, text)"""
+    pairs = list(split_pages(pages, chunk_size, chunk_overlap))
+    return [chunk for chunk, _ in pairs], [page for _, page in pairs]
+
+
+def timed(fn, *args):
+    """Run a task and also return how long it took and the worker's peak memory while running it"""
+    reset_peak_rss()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start, peak_rss_bytes()
+
+
+def get_executor(workers):
+    """Shared process pool per worker count; None means run inline"""
+    if workers <= 1:
+        return None
+    if workers not in _executors:
+        # spawn keeps torch/tokenizer threads of the parent out of the workers
+        context = multiprocessing.get_context("spawn")
+        _executors[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _executors[workers]
+
+
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown(wait=True)
+    _executors.clear()
+
+
+def _submit(executor, fn, *args):
+    if executor is not None:
+        return executor.submit(fn, *args)
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+def plan_pdfs(zip_path, workers, pdf_names=None, spool_dir=SPOOL_DIR):
+    """List (pdf_name, spool_path, page_ranges) in zip order.
+
+    spool_path is None for PDFs small enough to read into memory, and
+    page_ranges is None for whole-PDF tasks. The caller removes the spool files.
+    """
+    import fitz
+    plans = []
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        for info in zf.infolist():
+            if not info.filename.endswith(".pdf") or (pdf_names is not None and info.filename not in pdf_names):
+                continue
+            path = spool_pdf(zf, info, spool_dir) if info.file_size > SPOOL_PDF_BYTES else None
+            ranges = None
+            if workers > 1 and info.file_size > LARGE_PDF_BYTES:
+                doc = fitz.open(path) if path is not None else fitz.open(stream=zf.read(info), filetype="pdf")
+                page_count = doc.page_count
+                doc.close()
+                ranges = [
+                    (start, min(start + PAGES_PER_TASK, page_count))
+                    for start in range(0, page_count, PAGES_PER_TASK)
+                ]
+            plans.append((info.filename, path, ranges))
+    return plans
+
+
+def remove_spool_files(plans):
+    for _, path, _ in plans:
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f" Could not remove spool file {path}: {e}")
+
+
+def ingest_zip(zip_path, chunk_size, chunk_overlap, embed_batch=None,
+               workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE, pdf_names=None):
+    """Return ({pdf_name: (chunks, chunk pages)}, float32 embeddings, stats) for one zip.
+
+    `embed_batch(texts)` is called with at most `batch_size` chunks at a time;
+    without it only the chunks are produced and the embeddings are empty.
+    `pdf_names` limits ingestion to those PDFs of the zip. Chunk pages are
+    1-based page numbers, one per chunk.
+    """
+    start = time.perf_counter()
+    executor = get_executor(workers)
+    reset_peak_rss()
+    plans = plan_pdfs(zip_path, workers, pdf_names)
+    try:
+        peaks = [peak_rss_bytes()]
+        pending = []
+        for pdf_name, path, ranges in plans:
+            if ranges is None:
+                pending.append((pdf_name, None, _submit(executor, timed, process_pdf, zip_path, pdf_name, path, chunk_size, chunk_overlap)))
+            else:
+                futures = [_submit(executor, timed, extract_pages, zip_path, pdf_name, path, first, last) for first, last in ranges]
+                pending.append((pdf_name, ranges, futures))
+
+        zip_chunks = {}
+        pdf_seconds = {}
+        vectors = []
+        batch = []
+        pages = 0
+        embed_seconds = 0.0
+
+        def flush(texts):
+            nonlocal embed_seconds
+            embed_start = time.perf_counter()
+            vectors.extend(embed_batch(texts))
+            embed_seconds += time.perf_counter() - embed_start
+
+        for pdf_name, ranges, work in pending:
+            if ranges is not None:
+                results = [future.result() for future in work]
+                page_texts = [page for texts, _, _ in results for page in texts]
+                pages += ranges[-1][1] if ranges else 0
+                (chunks, chunk_pages), split_seconds, split_peak = _submit(
+                    executor, timed, split_page_list, page_texts, chunk_size, chunk_overlap
+                ).result()
+                pdf_seconds[pdf_name] = sum(seconds for _, seconds, _ in results) + split_seconds
+                peaks.extend(peak for _, _, peak in results)
+                peaks.append(split_peak)
+            else:
+                (chunks, chunk_pages, page_count), pdf_seconds[pdf_name], peak = work.result()
+                pages += page_count
+                peaks.append(peak)
+            zip_chunks[pdf_name] = (chunks, chunk_pages)
+
+            if embed_batch is not None:
+                batch.extend(chunks)
+                while len(batch) >= batch_size:
+                    flush(batch[:batch_size])
+                    batch = batch[batch_size:]
+
+        if embed_batch is not None and batch:
+            flush(batch)
+
+        embeddings = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+        peaks.append(peak_rss_bytes())
+        peaks = [peak for peak in peaks if peak is not None]
+        stats = {
+            "pdfs": len(zip_chunks),
+            "pages": pages,
+            "chunks": sum(len(chunks) for chunks, _ in zip_chunks.values()),
+            "workers": workers,
+            "spooled": sum(1 for _, path, _ in plans if path is not None),
+            "embed_seconds": embed_seconds,
+            # extraction and splitting time per PDF, measured in the workers
+            "pdf_seconds": pdf_seconds,
+            # highest resident memory of this process, or of a worker while it ran one of the tasks
+            "peak_rss_bytes": max(peaks) if peaks else None,
+            "seconds": time.perf_counter() - start,
+        }
+        return zip_chunks, embeddings, stats
+    finally:
+        remove_spool_files(plans)
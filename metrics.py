@@ -0,0 +1,146 @@
+"""Latency histograms for the answer pipeline, exported in Prometheus text format.
+
+Each stage (query embedding, retrieval, prompt formatting, the Ollama call,
+syllabus loading, TTS, ...) is timed into a cumulative histogram, which
+Prometheus can aggregate, and a window of the most recent samples from
+which p50/p95/p99 are reported directly. Timings of the current request are also
+collected into a per-request breakdown when one is active.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_breakdown = contextvars.ContextVar("timing_breakdown", default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts plus the last `window` samples for quantiles"""
+
+    def __init__(self, buckets=BUCKETS, window=2048):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self.recent:
+            return {q: 0.0 for q in quantiles}
+        values = np.percentile(self.recent, [q * 100 for q in quantiles])
+        return dict(zip(quantiles, (float(v) for v in values)))
+
+
+class Metrics:
+    """Stage timers, counters and the per-request timing breakdown"""
+
+    def __init__(self, namespace="qa"):
+        self.namespace = namespace
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+        timings = _breakdown.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def note(self, key, value):
+        """Add a non-timing value (e.g. a token count) to the current request's breakdown"""
+        timings = _breakdown.get()
+        if timings is not None:
+            timings[key] = value
+
+    def start_request(self):
+        """Collect this context's stage timings (in ms) into a new dict and return it"""
+        timings = {}
+        _breakdown.set(timings)
+        return timings
+
+    @contextmanager
+    def request(self):
+        token = _breakdown.set({})
+        try:
+            yield _breakdown.get()
+        finally:
+            _breakdown.reset(token)
+
+    @staticmethod
+    def bind(iterator, context):
+        """Advance an iterator inside `context`, e.g. a streamed response after its view returned"""
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+
+    def summary(self):
+        """{stage: {"count", "p50_ms", "p95_ms", "p99_ms"}}"""
+        with self._lock:
+            return {
+                stage: {
+                    "count": histogram.count,
+                    **{f"p{int(q * 100)}_ms": value * 1000 for q, value in histogram.quantiles().items()},
+                }
+                for stage, histogram in sorted(self._histograms.items())
+            }
+
+    def render(self, gauges=None):
+        """Prometheus text exposition; `gauges` maps metric name -> (help, value)"""
+        name = f"{self.namespace}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of the answer pipeline.", f"# TYPE {name} histogram"]
+        recent = []
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+                for q, value in histogram.quantiles().items():
+                    recent.append(f'{name}_recent{{stage="{stage}",quantile="{q}"}} {value}')
+            counters = sorted(self._counters.items())
+
+        lines.append(f"# HELP {name}_recent Stage latency quantiles over the most recent samples.")
+        lines.append(f"# TYPE {name}_recent summary")
+        lines.extend(recent)
+        for counter, value in counters:
+            lines.append(f"# TYPE {self.namespace}_{counter} counter")
+            lines.append(f"{self.namespace}_{counter} {value}")
+        for gauge, (help_text, value) in sorted((gauges or {}).items()):
+            lines.append(f"# HELP {self.namespace}_{gauge} {help_text}")
+            lines.append(f"# TYPE {self.namespace}_{gauge} gauge")
+            lines.append(f"{self.namespace}_{gauge} {value}")
+        return "\n".join(lines) + "\n"
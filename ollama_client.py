@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OllamaOverloaded(Exception):
+    """Too many generations queued; the caller should retry later"""
+
+
+class OllamaUnavailable(Exception):
+    """The Ollama server could not be reached or returned an error"""
+
+
+class OllamaGate:
+    """Bounded number of in-flight generations with a bounded wait queue.
+
+    Requests beyond `max_in_flight` wait for a slot; once `max_queue` are
+    already waiting, or a wait exceeds `queue_timeout` seconds, they fail fast
+    with OllamaOverloaded instead of piling onto the model server. Background
+    work acquires with `patient=True`: it waits as long as it takes, outside
+    the queue limit, so it never turns away a student's request.
+    """
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, patient=False):
+        if patient:
+            start = time.perf_counter()
+            self._slots.acquire()
+            with self._lock:
+                self.in_flight += 1
+                self.served += 1
+            return time.perf_counter() - start
+
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise OllamaOverloaded(f"{self.waiting} requests already waiting for the model")
+            self.waiting += 1
+
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self.waiting -= 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            if not acquired:
+                self.timed_out += 1
+                raise OllamaOverloaded(f"No model slot free after {waited:.1f}s")
+            self.in_flight += 1
+            self.served += 1
+        return waited
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self, patient=False):
+        self.acquire(patient)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            admitted = self.served + self.timed_out
+            return {
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "served": self.served,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": self.total_wait / admitted * 1000 if admitted else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+class TokenStream:
+    """Iterator over streamed answer tokens that holds a gate slot until closed.
+
+    `final` is Ollama's last message (with its eval/prompt token timings) once
+    the stream has finished.
+    """
+
+    def __init__(self, response, gate):
+        self._response = response
+        self._gate = gate
+        self._lines = response.iter_lines()
+        self._closed = False
+        self.final = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            for line in self._lines:
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get("done"):
+                    self.final = message
+                    if message.get("response"):
+                        return message["response"]
+                    break
+                if message.get("response"):
+                    return message["response"]
+        except requests.exceptions.RequestException as e:
+            self.close()
+            raise OllamaUnavailable(str(e)) from e
+        self.close()
+        raise StopIteration
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+            self._gate.release()
+
+    def __del__(self):
+        self.close()
+
+
+class OllamaClient:
+    """Ollama /api/generate over a pooled keep-alive session, limited by an OllamaGate"""
+
+    def __init__(self, api_url, model, gate, options=None, keep_alive=None, pool_size=None):
+        self.api_url = api_url
+        self.model = model
+        self.gate = gate
+        self.options = options or {}
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or gate.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, max_tokens, stream):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {**self.options, "num_predict": max_tokens},
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def preload(self):
+        """Have Ollama load the model into memory: a generate request without a prompt"""
+        payload = {"model": self.model}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        with self.gate.slot():
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=(5, 300))
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                raise OllamaUnavailable(str(e)) from e
+
+    def generate(self, prompt, max_tokens=500, patient=False):
+        """Return Ollama's full response message; the answer text is under "response".
+
+        With patient, wait for a model slot however long it takes (for background work).
+        """
+        with self.gate.slot(patient):
+            try:
+                response = self.session.post(
+                    self.api_url, json=self._payload(prompt, max_tokens, False), timeout=(5, 60)
+                )
+                response.raise_for_status()
+                return response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                raise OllamaUnavailable(str(e)) from e
+
+    def stream(self, prompt, max_tokens=500):
+        """Start a streamed generation; errors before the first token are raised here"""
+        self.gate.acquire()
+        try:
+            # The read timeout applies between streamed lines, not to the whole answer
+            response = self.session.post(
+                self.api_url, json=self._payload(prompt, max_tokens, True), stream=True, timeout=(5, 60)
+            )
+        except requests.exceptions.RequestException as e:
+            self.gate.release()
+            raise OllamaUnavailable(str(e)) from e
+        if not response.ok:
+            response.close()
+            self.gate.release()
+            raise OllamaUnavailable(f"Ollama returned HTTP {response.status_code}")
+        return TokenStream(response, self.gate)
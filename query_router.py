@@ -0,0 +1,137 @@
+"""Question intent routing by nearest centroid over the query embedding.
+
+Each route has a handful of example questions. Their embeddings are
+averaged into one centroid per route, once, on first use, with the same
+model that embeds questions for retrieval. A question goes to the route
+whose centroid is most similar to its embedding, which is already computed
+for retrieval, so routing costs one small matrix product and no model call.
+"""
+import json
+import threading
+
+from vector_index import normalize_rows
+
+ROUTE_EXAMPLES = {
+    # Short lookups answered in a sentence or two
+    "factual": [
+        "What is the capital of India?",
+        "How many legs does an insect have?",
+        "What is the unit of length?",
+        "Name the three states of water.",
+        "Which gas do plants take in?",
+        "Who is the author of this poem?",
+        "What is the opposite of hot?",
+        "How many days are there in a week?",
+        "Which animal is called the ship of the desert?",
+        "What is 12 multiplied by 3?",
+        "What do we call a baby frog?",
+        "Which is the largest planet?",
+    ],
+    # Explanations that need a paragraph
+    "general": [
+        "Why do we need clean water?",
+        "How do plants make their food?",
+        "Explain how rain is formed.",
+        "Why should we wash our hands before eating?",
+        "How do birds build their nests?",
+        "What happens to water when it is heated?",
+        "Why do leaves fall in autumn?",
+        "How does a seed grow into a plant?",
+        "What is the difference between a village and a city?",
+        "How can we save electricity at home?",
+        "Why is the sun important for living things?",
+        "How do we measure the length of a table?",
+    ],
+    # Overviews of a chapter, lesson or book
+    "summarize": [
+        "Summarize the chapter on plants.",
+        "Give me an overview of lesson 3.",
+        "What is this chapter about?",
+        "Give a brief summary of the story.",
+        "Recap the main points of the unit on animals.",
+        "What are the key ideas of the chapter on water?",
+        "Tell me the main points of this lesson in short.",
+        "Summarize evs_book1.pdf.",
+        "What did we learn in the chapter about our family?",
+        "Give me the gist of the poem.",
+    ],
+    # New material built from the syllabus
+    "generate": [
+        "Create five questions on the chapter about plants.",
+        "Make a quiz from lesson 2.",
+        "Write a short poem about the rain.",
+        "Generate multiple choice questions on the water cycle.",
+        "Write a story about a clever crow.",
+        "Prepare a worksheet on addition for practice.",
+        "Make fill in the blanks from the chapter on animals.",
+        "Compose a letter to your friend about your school trip.",
+        "Develop a lesson plan for teaching shapes.",
+        "Give me ten practice problems on multiplication.",
+    ],
+}
+
+
+def load_examples(path):
+    """Route examples from a JSONL file of {"question": ..., "route": ...} lines"""
+    examples = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                examples.setdefault(record["route"], []).append(record["question"])
+    return examples
+
+
+class QueryRouter:
+    """Picks a route for a question embedding by cosine similarity to per-route centroids"""
+
+    def __init__(self, embed_batch, examples=None, default="general"):
+        self.embed_batch = embed_batch
+        self.examples = {route: list(questions) for route, questions in (examples or ROUTE_EXAMPLES).items()}
+        self.default = default
+        self.routes = None
+        self._centroids = None
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def add_examples(self, examples):
+        with self._lock:
+            for route, questions in examples.items():
+                self.examples.setdefault(route, []).extend(questions)
+            self._centroids = None
+
+    def centroids(self):
+        """(route names, unit centroid matrix), embedding the examples on first call"""
+        with self._lock:
+            if self._centroids is None:
+                routes = sorted(self.examples)
+                questions = [question for route in routes for question in self.examples[route]]
+                vectors = normalize_rows(self.embed_batch(questions))
+                centroids, offset = [], 0
+                for route in routes:
+                    count = len(self.examples[route])
+                    centroids.append(vectors[offset:offset + count].mean(axis=0))
+                    offset += count
+                self.routes = routes
+                self._centroids = normalize_rows(centroids)
+            return self.routes, self._centroids
+
+    def scores(self, query_embedding):
+        """{route: cosine similarity of the question to the route's centroid}"""
+        routes, centroids = self.centroids()
+        similarities = centroids @ normalize_rows(query_embedding)[0]
+        return dict(zip(routes, (float(value) for value in similarities)))
+
+    def route(self, query_embedding):
+        scores = self.scores(query_embedding)
+        route = max(scores, key=scores.get) if scores else self.default
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + 1
+        return route
+
+    def stats(self):
+        with self._lock:
+            return {
+                "examples": {route: len(questions) for route, questions in sorted(self.examples.items())},
+                "routed": dict(sorted(self._counts.items())),
+            }
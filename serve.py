@@ -0,0 +1,40 @@
+"""Production entry point for the Flask backend.
+
+Serves app.py with waitress, a multi-threaded pure-Python WSGI server that
+runs on Linux, macOS and Windows. Each request thread awaits the async views
+in app.py, which hand embedding to a per-core pool and model/TTS calls to an
+I/O pool, so slow Ollama answers never hold up other students.
+
+    python serve.py --port 5000 --threads 64
+
+The ingestion and transcription pools start their workers with spawn, which
+re-imports this script in every worker, so app.py is only imported inside
+main(): a worker then loads just the module it runs tasks from.
+"""
+import argparse
+import os
+
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "64"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Smart Q/A backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS)
+    args = parser.parse_args()
+
+    from waitress import serve
+
+    from app import WARMUP_ON_START, app, warmup
+
+    print(f"Serving on http://{args.host}:{args.port} with {args.threads} threads")
+    if WARMUP_ON_START:
+        # Requests are accepted right away; /api/ready reports when the models are loaded
+        warmup.start()
+    # send_bytes=1 flushes every write so /api/ask/stream tokens reach the client immediately
+    serve(app, host=args.host, port=args.port, threads=args.threads, send_bytes=1, channel_timeout=300)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Single-flight deduplication of identical in-flight requests.
+
+When many students submit the same question at once, the first request
+(the leader) does the work and the others wait for its result instead of
+repeating retrieval and generation. A streamed answer is shared through a
+SharedStream: every attached request reads the same tokens, replaying the
+ones generated before it joined.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Futures for in-flight work, keyed so that concurrent identical calls share one"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        """(future, leader): the in-flight future for key, or a new one the caller must resolve"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def resolve(self, key, future, result=None, error=None, keep=False):
+        """Complete a leader's future; with keep, later requests can still join until forget()"""
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        if error is not None or not keep:
+            self.forget(key, future)
+
+    def forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class SharedStream:
+    """Fans one token iterator out to any number of readers.
+
+    Readers take turns pulling the next token from the source, so no extra
+    thread is needed. Each reader starts from the first token. When the
+    source ends, or every reader has gone before it did, the source is
+    closed and `on_close` is called.
+    """
+
+    def __init__(self, source, on_close=None):
+        self._source = iter(source)
+        self._close_source = getattr(source, "close", None)
+        self._on_close = on_close
+        self._items = []
+        self._done = False
+        self._error = None
+        self._pulling = False
+        self._readers = 0
+        self._cond = threading.Condition()
+
+    def reader(self):
+        with self._cond:
+            self._readers += 1
+        return self._read()
+
+    def _read(self):
+        position = 0
+        try:
+            while True:
+                found, item = self._item(position)
+                if not found:
+                    return
+                position += 1
+                yield item
+        finally:
+            with self._cond:
+                self._readers -= 1
+                abandoned = self._readers == 0 and not self._done
+                if abandoned:
+                    self._done = True
+                    self._error = StreamAbandoned("Every reader left before the answer was complete")
+                    self._cond.notify_all()
+            if abandoned:
+                self._close()
+
+    def _item(self, position):
+        """(True, token at position) or (False, None) at the end, pulling from the source if it is our turn"""
+        with self._cond:
+            while True:
+                if position < len(self._items):
+                    return True, self._items[position]
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return False, None
+                if not self._pulling:
+                    self._pulling = True
+                    break
+                self._cond.wait()
+
+        finished, error = False, None
+        try:
+            item = next(self._source)
+        except StopIteration:
+            finished = True
+        except Exception as e:
+            finished, error = True, e
+        with self._cond:
+            self._pulling = False
+            if finished:
+                self._done = True
+                self._error = error
+            else:
+                self._items.append(item)
+            self._cond.notify_all()
+        if finished:
+            self._close()
+        return self._item(position)
+
+    def _close(self):
+        if self._close_source is not None:
+            self._close_source()
+        if self._on_close is not None:
+            self._on_close()
+
+
+class StreamAbandoned(Exception):
+    """A shared stream was closed because nobody was reading it any more"""
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import time
+import json
 import base64
 import io
 from streamlit.components.v1 import html
@@ -20,8 +21,8 @@ if 'syllabus_loaded' not in st.session_state:
     st.session_state.syllabus_loaded = False
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
-if 'listening' not in st.session_state:
-    st.session_state.listening = False
+if 'last_recording' not in st.session_state:
+    st.session_state.last_recording = None
 if 'voice_answer' not in st.session_state:
     st.session_state.voice_answer = None
 if 'speak_buttons_clicked' not in st.session_state:
@@ -62,6 +63,45 @@ def speak_text_directly(text):
     """
     html(js_code, height=0)
 
+def stream_answer(payload, timings):
+    """Yield answer tokens from the backend's Server-Sent Events stream"""
+    with requests.post(f"{API_BASE_URL}/ask/stream", json=payload, stream=True, timeout=(5, 120)) as response:
+        # 503 (model busy) and 502 (model unreachable) carry a message for the student
+        if response.status_code in (502, 503):
+            yield response.json()["answer"]
+            return
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("done"):
+                timings.update(event)
+                break
+            yield event.get("token") or event.get("error", "")
+
+def stream_batch(payload):
+    """Yield (index, result) from the backend's batch stream as each answer completes"""
+    with requests.post(f"{API_BASE_URL}/ask/batch", json={**payload, "stream": True}, stream=True, timeout=(5, 600)) as response:
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(response.json().get("message", "Batch request failed"))
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("done"):
+                break
+            if "index" in event:
+                yield event["index"], event
+
+def format_sources(sources):
+    """"book.pdf p. 3, 4; other.pdf" from the sources an answer cites"""
+    parts = []
+    for source in sources or []:
+        pages = ", ".join(str(page) for page in source["pages"])
+        parts.append(f"{source['pdf']} p. {pages}" if pages else source["pdf"])
+    return "; ".join(parts)
+
 st.title("📚 Smart Q/A Tool")
 st.markdown("Select your class and subject, then ask questions about your syllabus!")
 
@@ -146,103 +186,123 @@ if st.session_state.syllabus_loaded:
         
         payload = {
             "question": question,
-            "use_voice": False
+            "class": st.session_state.selected_class,
+            "subject": st.session_state.selected_subject
         }
         
-        response = requests.post(f"{API_BASE_URL}/ask", json=payload) 
-        
-        if response.status_code == 200:
-            result = response.json()
-            answer = result["answer"]
-            
+        timings = {}
+        try:
             with st.chat_message("assistant"):
-                st.write(answer)
+                answer = st.write_stream(stream_answer(payload, timings))
+                
+                if timings.get("ttft_ms") is not None:
+                    st.caption(f"First token in {timings['ttft_ms'] / 1000:.1f}s, full answer in {timings['total_ms'] / 1000:.1f}s")
+                if format_sources(timings.get("sources")):
+                    st.caption(f"Sources: {format_sources(timings['sources'])}")
                 
                 if st.button("🔊 Speak Answer", key="speak_new_answer"):
-                    st.session_state.tts_trigger = chat["answer"]
+                    st.session_state.tts_trigger = answer
                     st.rerun()
             
             st.session_state.chat_history.append({
                 "question": question,
                 "answer": answer
             })
-        else:
+        except requests.exceptions.RequestException:
             st.error("Failed to get answer. Please try again.")
 
+if st.session_state.syllabus_loaded:
+    with st.expander("📝 Answer a worksheet"):
+        worksheet = st.text_area("One question per line", key="worksheet_questions")
+        if st.button("Answer all", key="answer_worksheet"):
+            questions = [line.strip() for line in worksheet.splitlines() if line.strip()]
+            if questions:
+                payload = {
+                    "questions": questions,
+                    "class": st.session_state.selected_class,
+                    "subject": st.session_state.selected_subject
+                }
+                # One placeholder per question, filled in as the answers arrive in any order
+                placeholders = [st.empty() for _ in questions]
+                for index, question in enumerate(questions):
+                    placeholders[index].markdown(f"**{index + 1}. {question}**\n\n_Answering..._")
+                try:
+                    for index, result in stream_batch(payload):
+                        sources = format_sources(result.get("sources"))
+                        text = f"**{index + 1}. {result['question']}**\n\n{result['answer']}"
+                        placeholders[index].markdown(text + (f"\n\n_Sources: {sources}_" if sources else ""))
+                except requests.exceptions.RequestException as e:
+                    st.error(f"Failed to answer the worksheet: {e}")
+
 st.markdown("---")
 st.subheader("Voice Input")
 
 voice_input_col1, voice_input_col2 = st.columns([3, 1])
 
 with voice_input_col1:
-    if st.button("🎤 Start Voice Input", type="secondary", use_container_width=True):
-        st.session_state.listening = True
-        listening_placeholder = st.empty()
+    # Recorded in the browser and transcribed offline by the backend; older
+    # Streamlit versions without a recorder fall back to uploading a clip
+    record_audio = getattr(st, "audio_input", None) or getattr(st, "experimental_audio_input", None)
+    if record_audio is not None:
+        recording = record_audio("🎤 Record your question")
+    else:
+        recording = st.file_uploader("🎤 Upload a recorded question", type=["wav", "webm", "ogg", "mp3", "m4a"])
 
-        with listening_placeholder:
-            st.info("🎤 Listening... Please speak your question now")
-
-        payload = {
-            "question": "",
-            "use_voice": True
-        }
+    if recording is not None and st.session_state.last_recording != recording.file_id:
+        st.session_state.last_recording = recording.file_id
 
         try:
-            response = requests.post(f"{API_BASE_URL}/ask", json=payload)
-        
-            if response.status_code == 200:
-                result = response.json()
-                voice_question = result.get("voice_input", "")
-                is_voice_error = result.get("is_voice_error", False)
-            
-                listening_placeholder.empty()
-            
-                if voice_question:
-                    if is_voice_error:
-                        st.warning(f"Voice recognition: {voice_question}")
-                    else:
-                        st.success(f"🎤 Recognized: \"{voice_question}\"")
-            
-                if not is_voice_error and voice_question and not any(x in voice_question.lower() for x in ["error", "sorry", "detected", "couldn't understand"]):
-                    with st.chat_message("user"):
-                        st.write(voice_question)
-                
-                    payload = {
-                        "question": voice_question,
-                        "use_voice": False
-                    }
-                
-                    response = requests.post(f"{API_BASE_URL}/ask", json=payload)
-                
-                    if response.status_code == 200:
-                        result = response.json()
-                        answer = result["answer"]
-                        
-                        st.session_state.voice_answer = answer
-                    
-                        with st.chat_message("assistant"):
-                            st.write(answer)
-                            
-                            if st.button("🔊 Speak Answer", key="speak_voice_response"):
-                                st.session_state.tts_trigger = chat["answer"]
-                                st.rerun()
-                    
-                        st.session_state.chat_history.append({
-                            "question": voice_question,
-                            "answer": answer
-                        })
-                    else:
-                        st.error("Failed to get answer for voice question. Please try again.")
+            with st.spinner("Transcribing your question..."):
+                response = requests.post(
+                    f"{API_BASE_URL}/transcribe",
+                    files={"audio": (recording.name, recording.getvalue(), recording.type)}
+                )
+            result = response.json()
+            voice_question = result.get("text", "")
+
+            if result.get("status") != "success":
+                st.warning(f"Voice recognition: {result.get('message', 'Please try again.')}")
             else:
-                st.error("Failed to process voice input. Please try again.")
-            
+                st.success(f"🎤 Recognized: \"{voice_question}\"")
+
+                with st.chat_message("user"):
+                    st.write(voice_question)
+
+                payload = {
+                    "question": voice_question,
+                    "class": st.session_state.selected_class,
+                    "subject": st.session_state.selected_subject
+                }
+
+                response = requests.post(f"{API_BASE_URL}/ask", json=payload)
+
+                if response.status_code in (200, 502, 503):
+                    result = response.json()
+                    answer = result["answer"]
+
+                    st.session_state.voice_answer = answer
+
+                    with st.chat_message("assistant"):
+                        st.write(answer)
+                        if format_sources(result.get("sources")):
+                            st.caption(f"Sources: {format_sources(result['sources'])}")
+
+                        if st.button("🔊 Speak Answer", key="speak_voice_response"):
+                            st.session_state.tts_trigger = answer
+                            st.rerun()
+
+                    st.session_state.chat_history.append({
+                        "question": voice_question,
+                        "answer": answer
+                    })
+                else:
+                    st.error("Failed to get answer for voice question. Please try again.")
+
         except requests.exceptions.ConnectionError:
             st.error("Cannot connect to the backend server. Please make sure the Flask server is running.")
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
 
-        st.session_state.listening = False
-
 if st.session_state.tts_trigger:
     speak_text_directly(st.session_state.tts_trigger)
     st.session_state.tts_trigger = None
@@ -0,0 +1,220 @@
+"""Hierarchical map-reduce summaries of syllabus PDFs.
+
+Consecutive chunks are grouped into sections and each section is summarized
+(map); section summaries are then merged in groups until a single document
+summary is left (reduce). Summaries are computed once per PDF on a
+background thread and stored next to the chunk cache, so summary questions
+can be answered from them instead of re-reading the raw text. Section
+summaries are saved as they finish, so a job that fails part way resumes
+from the last finished section the next time the PDF is queued.
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+SUMMARY_VERSION = 1
+
+SECTION_PROMPT = """Summarize this part of a school textbook in 3-5 short sentences for students.
+Keep key facts, names and terms.
+
+Text: {text}
+
+Summary:"""
+
+REDUCE_PROMPT = """Combine these summaries of consecutive parts of a school textbook into one
+well-structured summary for students. Keep the most important ideas in order.
+
+Summaries:
+{text}
+
+Combined summary:"""
+
+
+def summary_key(content_key, pdf_name, model, settings=None):
+    """Key a PDF's summary by its content hash, so unchanged PDFs keep their summary when a zip is updated"""
+    payload = json.dumps(
+        {"content": content_key, "pdf": pdf_name, "model": model, "settings": settings, "version": SUMMARY_VERSION},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    """JSON summaries on disk, one file per PDF key, with an in-memory memo"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._memo[key] = summary
+        return summary
+
+    def put(self, key, summary):
+        self._write(self._path(key), summary)
+        with self._lock:
+            self._memo[key] = summary
+        try:
+            os.remove(self._partial_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _partial_path(self, key):
+        return os.path.join(self.directory, f"{key}.partial.json")
+
+    def get_partial(self, key):
+        """Section summaries saved by an unfinished job, or an empty list"""
+        try:
+            with open(self._partial_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)["sections"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def put_partial(self, key, sections):
+        self._write(self._partial_path(key), {"sections": sections})
+
+    def _write(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+class Summarizer:
+    """Map-reduce over a PDF's chunks using `generate(prompt, max_tokens) -> str`"""
+
+    def __init__(self, generate, chunks_per_section=6, reduce_fanout=6,
+                 section_tokens=160, document_tokens=400):
+        self.generate = generate
+        self.chunks_per_section = chunks_per_section
+        self.reduce_fanout = reduce_fanout
+        self.section_tokens = section_tokens
+        self.document_tokens = document_tokens
+
+    def summarize(self, pdf_name, chunks, done_sections=(), on_section=None):
+        """Summary of a PDF, reusing `done_sections` from an earlier attempt.
+
+        `on_section(sections)` is called after each new section summary.
+        """
+        sections = []
+        for start in range(0, len(chunks), self.chunks_per_section):
+            end = min(start + self.chunks_per_section, len(chunks))
+            position = len(sections)
+            if position < len(done_sections) and done_sections[position]["chunks"] == [start, end]:
+                sections.append(done_sections[position])
+                continue
+            text = " ".join(chunks[start:end])
+            sections.append({
+                "chunks": [start, end],
+                "summary": self.generate(SECTION_PROMPT.format(text=text), self.section_tokens).strip(),
+            })
+            if on_section is not None:
+                on_section(sections)
+
+        level = [section["summary"] for section in sections]
+        while len(level) > 1:
+            level = [
+                self.generate(
+                    REDUCE_PROMPT.format(text="\n\n".join(level[i:i + self.reduce_fanout])),
+                    self.document_tokens,
+                ).strip()
+                for i in range(0, len(level), self.reduce_fanout)
+            ]
+
+        return {
+            "pdf": pdf_name,
+            "sections": sections,
+            "document": level[0] if level else "",
+            "created": time.time(),
+        }
+
+
+class SummaryJobs:
+    """Single background thread that summarizes queued PDFs one at a time.
+
+    One worker keeps summarization from taking more than one model slot away
+    from students asking questions.
+    """
+
+    def __init__(self, summarizer, store):
+        self.summarizer = summarizer
+        self.store = store
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.completed = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    def schedule(self, key, pdf_name, load_chunks):
+        """Queue a PDF unless it is already summarized or queued.
+
+        `load_chunks()` returns the PDF's chunk texts; it is only called by the
+        background thread, so requests finding the job pending decode nothing.
+        """
+        if self.store.get(key) is not None:
+            return False
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="summary-jobs", daemon=True)
+                self._thread.start()
+        self._queue.put((key, pdf_name, load_chunks))
+        return True
+
+    def _run(self):
+        while True:
+            key, pdf_name, load_chunks = self._queue.get()
+            start = time.perf_counter()
+            try:
+                chunks = load_chunks()
+                done_sections = self.store.get_partial(key)
+                if done_sections:
+                    print(f"Resuming the summary of {pdf_name} after {len(done_sections)} sections")
+                summary = self.summarizer.summarize(
+                    pdf_name, chunks, done_sections, lambda sections: self.store.put_partial(key, sections)
+                )
+                self.store.put(key, summary)
+                self.completed += 1
+                print(f"Summarized {pdf_name} in {time.perf_counter() - start:.1f}s")
+            except Exception as e:
+                self.failed += 1
+                print(f"Could not summarize {pdf_name}: {e}")
+            finally:
+                self.seconds += time.perf_counter() - start
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "seconds": self.seconds,
+        }
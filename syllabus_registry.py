@@ -0,0 +1,151 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from vector_index import FlatIndex
+
+_generations = itertools.count(1)
+
+
+class Corpus:
+    """One loaded (class, subject) syllabus: its chunks (a ChunkStore) and their embeddings"""
+
+    def __init__(self, key, chunks, embeddings, index=None, lexical_index=None):
+        self.key = key
+        # Distinguishes this load from earlier and later loads of the same syllabus
+        self.generation = next(_generations)
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.index = index if index is not None else FlatIndex(embeddings)
+        self.lexical_index = lexical_index
+        # pdf_name -> key of its precomputed summary
+        self.summary_keys = {}
+        # pdf_name -> content hash
+        self.pdf_hashes = {}
+        # zip path -> (mtime_ns, size) when loaded
+        self.sources = {}
+        self.loaded_at = time.time()
+        self.memory_bytes = self._estimate_memory()
+
+    def _estimate_memory(self):
+        lexical_bytes = self.lexical_index.nbytes if self.lexical_index is not None else 0
+        # An index that only reads candidate rows leaves the memory-mapped vectors on disk
+        vector_bytes = int(self.embeddings.nbytes) if getattr(self.index, "scans_vectors", True) else 0
+        return vector_bytes + self.index.nbytes + lexical_bytes + self.chunks.nbytes
+
+    @property
+    def pdf_rows(self):
+        """pdf_name -> its (first, last) rows in chunks/embeddings"""
+        return self.chunks.pdf_rows
+
+    @property
+    def documents(self):
+        """LangChain Documents for the chunks, built on access"""
+        return self.chunks.documents
+
+    @property
+    def name(self):
+        return " - ".join(self.key)
+
+
+class SyllabusRegistry:
+    """LRU cache of loaded corpora bounded by an approximate memory budget.
+
+    `loader(class_name, subject, previous)` builds a Corpus (or returns None
+    when there is no data), given the corpus it replaces when reloading.
+    Different corpora load in parallel; concurrent requests for the same corpus
+    wait for a single load. `is_stale(corpus)` tells whether a resident corpus
+    should be reloaded when it is requested with refresh.
+    """
+
+    def __init__(self, loader, max_bytes, is_stale=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.is_stale = is_stale
+        self._corpora = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._counters = {}
+        self.evictions = 0
+
+    def _count(self, key, field):
+        counters = self._counters.setdefault(key, {"hits": 0, "misses": 0, "loads": 0, "reloads": 0})
+        counters[field] += 1
+
+    def get(self, class_name, subject, refresh=False):
+        """The corpus for a syllabus, loading it on a miss.
+
+        With refresh, a resident corpus whose files changed is reloaded, and
+        the loader gets the old one to reuse what did not change.
+        """
+        key = (class_name, subject)
+        with self._lock:
+            resident = self._corpora.get(key)
+        stale = resident is not None and refresh and self.is_stale is not None and self.is_stale(resident)
+
+        with self._lock:
+            if resident is not None and not stale:
+                self._corpora.move_to_end(key)
+                self._count(key, "hits")
+                return resident
+            if resident is None:
+                self._count(key, "misses")
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                current = self._corpora.get(key)
+                if current is not None and current is not resident:
+                    # Loaded or reloaded by another request while we waited
+                    self._corpora.move_to_end(key)
+                    return current
+
+            corpus = self.loader(class_name, subject, current)
+            if corpus is None:
+                return current
+
+            with self._lock:
+                self._count(key, "reloads" if current is not None else "loads")
+                self._corpora[key] = corpus
+                self._corpora.move_to_end(key)
+                self._evict(keep=key)
+            return corpus
+
+    def invalidate(self, class_name, subject):
+        with self._lock:
+            return self._corpora.pop((class_name, subject), None) is not None
+
+    def _evict(self, keep):
+        while self._total_bytes() > self.max_bytes and len(self._corpora) > 1:
+            key = next(iter(self._corpora))
+            if key == keep:
+                break
+            evicted = self._corpora.pop(key)
+            self.evictions += 1
+            print(f"Evicted {evicted.name} ({evicted.memory_bytes / 1e6:.1f} MB) from the syllabus registry")
+
+    def _total_bytes(self):
+        return sum(corpus.memory_bytes for corpus in self._corpora.values())
+
+    def stats(self):
+        with self._lock:
+            corpora = []
+            for key, counters in self._counters.items():
+                corpus = self._corpora.get(key)
+                corpora.append({
+                    "class": key[0],
+                    "subject": key[1],
+                    "resident": corpus is not None,
+                    "memory_bytes": corpus.memory_bytes if corpus else 0,
+                    "chunks": len(corpus.chunks) if corpus else 0,
+                    "index": corpus.index.kind if corpus else None,
+                    "index_recall": getattr(corpus.index, "recall", None) if corpus else None,
+                    **counters,
+                })
+            return {
+                "memory_bytes": self._total_bytes(),
+                "budget_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "corpora": corpora,
+            }
@@ -0,0 +1,244 @@
+"""Offline transcription of uploaded audio questions.
+
+Uploads are decoded block by block as they arrive: WAV directly, anything
+else (webm/ogg/mp3 from browsers) through an ffmpeg pipe. The mono PCM is
+then recognized by a local engine on a process pool, so recognition never
+runs on a web server thread and nothing leaves the machine.
+
+Like ingest.py, this module is imported by the pool workers and must stay
+cheap to import.
+"""
+import json
+import multiprocessing
+import shutil
+import subprocess
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+READ_BLOCK = 64 * 1024
+FFMPEG_RATE = 16000
+
+_recognizers = {}
+
+
+class AudioDecodeError(Exception):
+    """The upload is not audio we can decode"""
+
+
+class AudioTooLong(Exception):
+    """The upload is longer than the allowed question length"""
+
+
+class TranscriptionError(Exception):
+    """The recognition engine failed or is not installed"""
+
+
+class _PrefixedReader:
+    """File-like view of already-read header bytes followed by the rest of a stream"""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._stream.read(size)
+        if size < 0:
+            data, self._prefix = self._prefix + self._stream.read(), b""
+            return data
+        data, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+
+def to_mono16(frames, sample_width, channels):
+    """Signed 16-bit mono PCM from interleaved little-endian frames"""
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.int32) - 128) << 8
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.int32)
+    elif sample_width == 3:
+        # Keep the two most significant bytes of each 24-bit sample
+        samples = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)[:, 1:].copy().view("<i2")[:, 0].astype(np.int32)
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4") >> 16
+    else:
+        raise AudioDecodeError(f"Unsupported sample width: {sample_width} bytes")
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples.astype("<i2").tobytes()
+
+
+def _decode_wav(reader, max_seconds):
+    try:
+        wav = wave.open(reader, "rb")
+    except (wave.Error, EOFError) as e:
+        raise AudioDecodeError(f"Invalid WAV file: {e}") from e
+    rate, width, channels = wav.getframerate(), wav.getsampwidth(), wav.getnchannels()
+    max_frames = int(max_seconds * rate)
+    frames_per_block = max(1, READ_BLOCK // (width * channels))
+    parts = []
+    read = 0
+    while True:
+        frames = wav.readframes(frames_per_block)
+        if not frames:
+            break
+        read += len(frames) // (width * channels)
+        if read > max_frames:
+            raise AudioTooLong(f"Audio is longer than {max_seconds:.0f}s")
+        parts.append(to_mono16(frames, width, channels))
+    return b"".join(parts), rate
+
+
+def _decode_ffmpeg(reader, max_seconds):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise AudioDecodeError("Only WAV uploads are supported without ffmpeg installed")
+    process = subprocess.Popen(
+        [ffmpeg, "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(FFMPEG_RATE), "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+
+    def feed():
+        try:
+            while True:
+                block = reader.read(READ_BLOCK)
+                if not block:
+                    break
+                process.stdin.write(block)
+        except (BrokenPipeError, ValueError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="ffmpeg-feed", daemon=True)
+    feeder.start()
+    max_bytes = int(max_seconds * FFMPEG_RATE) * 2
+    parts = []
+    size = 0
+    try:
+        while True:
+            block = process.stdout.read(READ_BLOCK)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                raise AudioTooLong(f"Audio is longer than {max_seconds:.0f}s")
+            parts.append(block)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        feeder.join()
+    if not parts:
+        raise AudioDecodeError("Could not decode the audio upload")
+    return b"".join(parts), FFMPEG_RATE
+
+
+def decode_audio(stream, max_seconds):
+    """Decode an uploaded audio stream to (16-bit mono PCM bytes, sample rate)"""
+    header = stream.read(12)
+    reader = _PrefixedReader(header, stream)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return _decode_wav(reader, max_seconds)
+    return _decode_ffmpeg(reader, max_seconds)
+
+
+def _recognize_sphinx(recognizer, audio, model):
+    return recognizer.recognize_sphinx(audio)
+
+
+def _recognize_whisper(recognizer, audio, model):
+    return recognizer.recognize_whisper(audio, model=model or "base", language="english")
+
+
+def _recognize_vosk(recognizer, audio, model):
+    return json.loads(recognizer.recognize_vosk(audio))["text"]
+
+
+ENGINES = {
+    "sphinx": _recognize_sphinx,
+    "whisper": _recognize_whisper,
+    "vosk": _recognize_vosk,
+}
+
+
+def recognize(engine, model, pcm, sample_rate):
+    """Run in a pool worker: returns (text, seconds spent recognizing)"""
+    import speech_recognition as sr
+
+    start = time.perf_counter()
+    if engine not in _recognizers:
+        _recognizers[engine] = sr.Recognizer()
+    audio = sr.AudioData(pcm, sample_rate, 2)
+    try:
+        text = ENGINES[engine](_recognizers[engine], audio, model)
+    except sr.UnknownValueError:
+        text = ""
+    except Exception as e:
+        raise TranscriptionError(f"{engine} recognition failed: {e}") from None
+    return text.strip(), time.perf_counter() - start
+
+
+class Transcriber:
+    """Offline recognition on a spawn-based process pool, with latency and real-time factor stats"""
+
+    def __init__(self, engine="sphinx", model=None, workers=2):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown transcription engine {engine!r}; choose from {sorted(ENGINES)}")
+        self.engine = engine
+        self.model = model
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.transcribed = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.recognize_seconds = 0.0
+        self.total_seconds = 0.0
+        self.max_latency = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def submit(self, pcm, sample_rate):
+        """Future of (text, recognition seconds) for decoded PCM"""
+        return self._get_executor().submit(recognize, self.engine, self.model, pcm, sample_rate)
+
+    def record(self, audio_seconds, recognize_seconds, total_seconds, failed=False):
+        with self._lock:
+            if failed:
+                self.failed += 1
+                return
+            self.transcribed += 1
+            self.audio_seconds += audio_seconds
+            self.recognize_seconds += recognize_seconds
+            self.total_seconds += total_seconds
+            self.max_latency = max(self.max_latency, total_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "engine": self.engine,
+                "workers": self.workers,
+                "transcribed": self.transcribed,
+                "failed": self.failed,
+                "audio_seconds": self.audio_seconds,
+                "avg_latency_ms": self.total_seconds / self.transcribed * 1000 if self.transcribed else 0.0,
+                "max_latency_ms": self.max_latency * 1000,
+                # recognition time per second of audio; below 1 is faster than real time
+                "real_time_factor": self.recognize_seconds / self.audio_seconds if self.audio_seconds else 0.0,
+            }
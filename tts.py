@@ -0,0 +1,244 @@
+"""Spoken answers: sentence-chunked MP3 synthesis with a content-addressed disk cache.
+
+Answers are split into sentences and each sentence is synthesized (or read
+from the cache) separately, so the first sentence can be sent while the rest
+are still being synthesized. MP3 segments concatenate into one playable
+stream. Cached audio is keyed by the sentence text and the backend's voice
+parameters and the least recently used files are deleted beyond a size cap.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict, deque
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+MAX_SEGMENT_CHARS = 300
+# Shorter sentences ("Yes.") are joined to the previous one rather than synthesized alone
+MIN_SEGMENT_CHARS = 20
+
+
+def split_sentences(text, max_chars=MAX_SEGMENT_CHARS):
+    """Sentences of `text`, very short ones merged and long ones split at word boundaries"""
+    segments = []
+    for sentence in SENTENCE_END.split(" ".join(text.split())):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            segments.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if not sentence:
+            continue
+        if segments and len(sentence) < MIN_SEGMENT_CHARS and len(segments[-1]) + len(sentence) < max_chars:
+            segments[-1] = f"{segments[-1]} {sentence}"
+        else:
+            segments.append(sentence)
+    return segments
+
+
+class GTTSBackend:
+    """Google Translate TTS (needs network access)"""
+
+    name = "gtts"
+
+    def __init__(self, lang="en", slow=False):
+        self.params = {"lang": lang, "slow": slow}
+
+    def synthesize(self, text):
+        from gtts import gTTS
+
+        audio = io.BytesIO()
+        gTTS(text=text, lang=self.params["lang"], slow=self.params["slow"], lang_check=False).write_to_fp(audio)
+        return audio.getvalue()
+
+
+class EspeakBackend:
+    """Offline espeak-ng voice, encoded to MP3 with ffmpeg"""
+
+    name = "espeak"
+
+    def __init__(self, voice="en", words_per_minute=150):
+        self.params = {"voice": voice, "words_per_minute": words_per_minute}
+        self.espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+        self.ffmpeg = shutil.which("ffmpeg")
+        if self.espeak is None or self.ffmpeg is None:
+            raise RuntimeError("The espeak TTS backend needs espeak-ng and ffmpeg installed")
+
+    def synthesize(self, text):
+        wav = subprocess.run(
+            [self.espeak, "--stdout", "-v", self.params["voice"], "-s", str(self.params["words_per_minute"]), text],
+            check=True, capture_output=True,
+        ).stdout
+        return subprocess.run(
+            [self.ffmpeg, "-loglevel", "error", "-f", "wav", "-i", "pipe:0", "-f", "mp3", "pipe:1"],
+            input=wav, check=True, capture_output=True,
+        ).stdout
+
+
+TTS_BACKENDS = {
+    "gtts": GTTSBackend,
+    "espeak": EspeakBackend,
+}
+
+
+class AudioCache:
+    """MP3 files on disk named by the hash of their text and voice, with an LRU size cap"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    def _scan(self):
+        """Pick up files from earlier runs, least recently used first"""
+        files = []
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith(".mp3"):
+                        stat = os.stat(os.path.join(root, name))
+                        files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._sizes[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def key(text, backend):
+        payload = json.dumps({"text": text, "backend": backend.name, "params": backend.params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+            self._sizes.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            # mtime orders the LRU when the cache is rescanned after a restart
+            os.utime(self._path(key))
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._sizes.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return audio
+
+    def put(self, key, audio):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(audio) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(audio)
+            while self.total_bytes > self.max_bytes and len(self._sizes) > 1:
+                oldest, size = self._sizes.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(oldest))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._sizes),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class SpeechSynthesizer:
+    """Streams an answer as MP3 segments, synthesizing up to `lookahead` sentences ahead on `executor`"""
+
+    def __init__(self, backend, cache, executor, lookahead=2):
+        self.backend = backend
+        self.cache = cache
+        self.executor = executor
+        self.lookahead = lookahead
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_first_audio = 0.0
+        self.max_first_audio = 0.0
+
+    def segment(self, sentence):
+        key = AudioCache.key(sentence, self.backend)
+        audio = self.cache.get(key)
+        if audio is None:
+            audio = self.backend.synthesize(sentence)
+            self.cache.put(key, audio)
+        return audio
+
+    def stream(self, text, started=None):
+        """Yield MP3 bytes sentence by sentence; errors in the first sentence are raised before any audio"""
+        started = started or time.perf_counter()
+        sentences = iter(split_sentences(text))
+        pending = deque()
+
+        def fill():
+            while len(pending) <= self.lookahead:
+                sentence = next(sentences, None)
+                if sentence is None:
+                    break
+                pending.append(self.executor.submit(self.segment, sentence))
+
+        fill()
+        first = pending.popleft().result() if pending else b""
+        self._record_first_audio(time.perf_counter() - started)
+
+        def generate():
+            try:
+                yield first
+                fill()
+                while pending:
+                    audio = pending.popleft().result()
+                    fill()
+                    yield audio
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        return generate()
+
+    def _record_first_audio(self, seconds):
+        print(f"Time to first audio: {seconds * 1000:.0f} ms")
+        with self._lock:
+            self.requests += 1
+            self.total_first_audio += seconds
+            self.max_first_audio = max(self.max_first_audio, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "requests": self.requests,
+                "avg_time_to_first_audio_ms": self.total_first_audio / self.requests * 1000 if self.requests else 0.0,
+                "max_time_to_first_audio_ms": self.max_first_audio * 1000,
+                "cache": self.cache.stats(),
+            }
@@ -0,0 +1,420 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def normalize_rows(vectors):
+    """Return vectors as a float32 matrix with unit-length rows"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first, without a full sort"""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    k = min(k, n)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def search(matrix, query_vector, k):
+    """Cosine top-k against a matrix of normalized rows"""
+    query = normalize_rows(query_vector)[0]
+    scores = matrix @ query
+    indices = top_k_indices(scores, k)
+    return indices, scores[indices]
+
+
+def search_batch(matrix, query_vectors, k):
+    """Cosine top-k for several queries with one matmul; a list of (indices, scores) per query"""
+    scores = normalize_rows(query_vectors) @ np.asarray(matrix).T
+    results = []
+    for row in scores:
+        indices = top_k_indices(row, k)
+        results.append((indices, row[indices]))
+    return results
+
+
+class FlatIndex:
+    """Exact search: one matmul over every vector"""
+
+    kind = "flat"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, vectors, **params):
+        return cls(vectors)
+
+    def patched(self, vectors, previous_rows):
+        return FlatIndex(vectors)
+
+    def search(self, query_vector, k):
+        return search(self.vectors, query_vector, k)
+
+    def search_batch(self, query_vectors, k):
+        return search_batch(self.vectors, query_vectors, k)
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def params(self):
+        return {}
+
+    def save(self, directory):
+        pass
+
+    @classmethod
+    def load(cls, directory, vectors, params):
+        return cls(vectors)
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=10, sample_size=None, seed=0):
+    """Cluster normalized vectors by cosine similarity; returns normalized centroids"""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample_size = min(n, sample_size or 256 * n_clusters)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Re-seed empty clusters from random sample points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_to_centroids(vectors, centroids, batch_size=65536):
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        assignments[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """Inverted-file index: k-means lists, searching only the `nprobe` closest lists.
+
+    Lists are stored as one int32 id array sorted by list plus offsets, and the
+    vectors themselves are shared with the corpus rather than copied.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, ids, offsets, nprobe):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.ids = ids
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=16, iterations=10, seed=0, **params):
+        n = vectors.shape[0]
+        nlist = min(n, nlist or max(1, int(np.sqrt(n))))
+        centroids = spherical_kmeans(vectors, nlist, iterations=iterations, seed=seed)
+        assignments = assign_to_centroids(vectors, centroids)
+        ids = np.argsort(assignments, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+        return cls(vectors, centroids, ids, offsets, nprobe)
+
+    def patched(self, vectors, previous_rows):
+        """The same lists over an updated corpus, without re-running k-means.
+
+        `previous_rows[i]` is row i's id in this index, or -1 for a new vector;
+        kept vectors stay in their list, new ones join the closest centroid and
+        ids missing from `previous_rows` are dropped.
+        """
+        nlist = self.centroids.shape[0]
+        previous_lists = np.empty(len(self.ids), dtype=np.int32)
+        previous_lists[np.asarray(self.ids)] = np.repeat(np.arange(nlist, dtype=np.int32), np.diff(self.offsets))
+        previous_rows = np.asarray(previous_rows)
+        kept = previous_rows >= 0
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        assignments[kept] = previous_lists[previous_rows[kept]]
+        new_rows = np.flatnonzero(~kept)
+        if new_rows.size:
+            assignments[new_rows] = assign_to_centroids(vectors[new_rows], self.centroids)
+        ids = np.argsort(assignments, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+        return IVFIndex(vectors, self.centroids, ids, offsets, self.nprobe)
+
+    def search(self, query_vector, k):
+        query = normalize_rows(query_vector)[0]
+        return self._search_probes(query, top_k_indices(self.centroids @ query, self.nprobe), k)
+
+    def search_batch(self, query_vectors, k):
+        """Probed lists for all queries are picked with one matmul against the centroids"""
+        queries = normalize_rows(query_vectors)
+        centroid_scores = queries @ self.centroids.T
+        return [
+            self._search_probes(query, top_k_indices(scores, self.nprobe), k)
+            for query, scores in zip(queries, centroid_scores)
+        ]
+
+    def _search_probes(self, query, probes, k):
+        candidates = np.concatenate([self.ids[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+        if candidates.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates.sort()
+        scores = np.asarray(self.vectors[candidates]) @ query
+        best = top_k_indices(scores, k)
+        return candidates[best].astype(np.int64), scores[best]
+
+    @property
+    def nbytes(self):
+        return int(self.centroids.nbytes + self.ids.nbytes + self.offsets.nbytes)
+
+    def params(self):
+        return {"nlist": int(self.centroids.shape[0]), "nprobe": self.nprobe}
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(directory, "ids.npy"), self.ids)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory, vectors, params):
+        return cls(
+            vectors,
+            np.load(os.path.join(directory, "centroids.npy")),
+            np.load(os.path.join(directory, "ids.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "offsets.npy")),
+            params.get("nprobe", 16),
+        )
+
+
+class HNSWIndex:
+    """Graph index backed by the optional hnswlib package"""
+
+    kind = "hnsw"
+
+    def __init__(self, graph, ef_search):
+        self.graph = graph
+        self.ef_search = ef_search
+        self.graph.set_ef(ef_search)
+
+    @classmethod
+    def build(cls, vectors, m=16, ef_construction=200, ef_search=64, **params):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed; pip install hnswlib or use the ivf index")
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph.init_index(max_elements=vectors.shape[0], M=m, ef_construction=ef_construction)
+        graph.add_items(np.asarray(vectors, dtype=np.float32), np.arange(vectors.shape[0]))
+        return cls(graph, ef_search)
+
+    def search(self, query_vector, k):
+        query = normalize_rows(query_vector)
+        k = min(k, self.graph.get_current_count())
+        self.graph.set_ef(max(self.ef_search, k))
+        labels, distances = self.graph.knn_query(query, k=k)
+        # hnswlib's "ip" distance is 1 - inner product
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+    def search_batch(self, query_vectors, k):
+        queries = normalize_rows(query_vectors)
+        k = min(k, self.graph.get_current_count())
+        self.graph.set_ef(max(self.ef_search, k))
+        labels, distances = self.graph.knn_query(queries, k=k)
+        return [(row.astype(np.int64), 1.0 - row_distances) for row, row_distances in zip(labels, distances)]
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def params(self):
+        return {"ef_search": self.ef_search}
+
+    def save(self, directory):
+        self.graph.save_index(os.path.join(directory, "hnsw.bin"))
+
+    @classmethod
+    def load(cls, directory, vectors, params):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed")
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph.load_index(os.path.join(directory, "hnsw.bin"), max_elements=vectors.shape[0])
+        return cls(graph, params.get("ef_search", 64))
+
+
+def quantize_int8(vectors, scales, batch_size=65536):
+    """Symmetric per-dimension int8 codes: round(vector / scales), clipped to [-127, 127]"""
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32) / scales
+        codes[start:start + batch_size] = np.clip(np.rint(block), -127, 127)
+    return codes
+
+
+class Int8Index:
+    """Exact scan over int8 scalar-quantized vectors, then float rescoring of the best candidates.
+
+    Each dimension is scaled by its largest magnitude so the codes use the
+    full int8 range; they take a quarter of the float32 memory. The
+    `rescore` * k best approximate matches are scored again against the
+    float vectors, which stay memory-mapped on disk, so only those rows
+    are read.
+    """
+
+    kind = "int8"
+    # Only candidate rows of the float vectors are read, so they need not stay resident
+    scans_vectors = False
+
+    def __init__(self, vectors, codes, scales, rescore):
+        self.vectors = vectors
+        self.codes = codes
+        self.scales = scales
+        self.rescore = rescore
+
+    @classmethod
+    def build(cls, vectors, rescore=4, **params):
+        scales = np.zeros(vectors.shape[1], dtype=np.float32)
+        for start in range(0, vectors.shape[0], 65536):
+            block = np.abs(np.asarray(vectors[start:start + 65536], dtype=np.float32))
+            scales = np.maximum(scales, block.max(axis=0))
+        scales = scales / 127.0
+        scales[scales == 0] = 1.0
+        return cls(vectors, quantize_int8(vectors, scales), scales, rescore)
+
+    def approximate_scores(self, queries, batch_size=512):
+        """Scores of every row for each query, from the codes: (queries, rows).
+
+        Codes are widened to float in blocks small enough to stay in cache.
+        """
+        weighted = (queries * self.scales).T
+        scores = np.empty((queries.shape[0], self.codes.shape[0]), dtype=np.float32)
+        for start in range(0, self.codes.shape[0], batch_size):
+            block = self.codes[start:start + batch_size].astype(np.float32)
+            scores[:, start:start + batch_size] = (block @ weighted).T
+        return scores
+
+    def search(self, query_vector, k):
+        query = normalize_rows(query_vector)
+        return self._rescored(query[0], self.approximate_scores(query)[0], k)
+
+    def search_batch(self, query_vectors, k):
+        queries = normalize_rows(query_vectors)
+        scores = self.approximate_scores(queries)
+        return [self._rescored(query, row, k) for query, row in zip(queries, scores)]
+
+    def _rescored(self, query, approximate, k):
+        candidates = np.sort(top_k_indices(approximate, k * self.rescore))
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        best = top_k_indices(scores, k)
+        return candidates[best], scores[best]
+
+    @property
+    def nbytes(self):
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    def params(self):
+        return {"rescore": self.rescore}
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "codes.npy"), self.codes)
+        np.save(os.path.join(directory, "scales.npy"), self.scales)
+        # A single zip's vectors are its memory-mapped cache entry; only vectors stacked from
+        # several zips exist just in RAM and need a copy to map for rescoring
+        if not isinstance(self.vectors, np.memmap):
+            np.save(os.path.join(directory, "vectors.npy"), np.asarray(self.vectors, dtype=np.float32))
+
+    @classmethod
+    def load(cls, directory, vectors, params):
+        vectors_path = os.path.join(directory, "vectors.npy")
+        if os.path.exists(vectors_path):
+            vectors = np.load(vectors_path, mmap_mode="r")
+        codes = np.load(os.path.join(directory, "codes.npy"))
+        if codes.shape != vectors.shape:
+            raise ValueError(f"codes {codes.shape} do not match vectors {vectors.shape}")
+        return cls(vectors, codes, np.load(os.path.join(directory, "scales.npy")), params.get("rescore", 4))
+
+
+INDEX_TYPES = {index.kind: index for index in (FlatIndex, IVFIndex, HNSWIndex, Int8Index)}
+
+
+def build_index(vectors, kind="flat", **params):
+    return INDEX_TYPES[kind].build(vectors, **params)
+
+
+def save_index(index, directory, extra=None):
+    """Write an index to a directory atomically; flat indexes only record their kind.
+
+    `extra` is merged into the index.json metadata.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        index.save(tmp_path)
+        with open(os.path.join(tmp_path, "index.json"), "w", encoding="utf-8") as f:
+            meta = {"kind": index.kind, "params": index.params(), "recall": getattr(index, "recall", None)}
+            json.dump({**meta, **(extra or {})}, f)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_path, directory)
+    except OSError as e:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        print(f" Could not save {index.kind} index: {e}")
+
+
+def load_index(directory, vectors):
+    """Load a saved index over `vectors`, or return None when there is none"""
+    meta_path = os.path.join(directory, "index.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = INDEX_TYPES[meta["kind"]].load(directory, vectors, meta["params"])
+        index.recall = meta.get("recall")
+        return index
+    except (OSError, ValueError, KeyError, ImportError) as e:
+        print(f" Ignoring unreadable index in {directory}: {e}")
+        return None
+
+
+def recall_at_k(index, vectors, queries, k):
+    """Mean fraction of the exact top-k that the index also returns"""
+    exact = FlatIndex(vectors)
+    found = 0
+    for query in queries:
+        expected = set(exact.search(query, k)[0].tolist())
+        found += len(expected & set(index.search(query, k)[0].tolist()))
+    return found / (len(queries) * min(k, vectors.shape[0]))
+
+
+def sample_queries(vectors, count=100, noise=0.05, seed=0):
+    """Perturbed corpus vectors to use as held-out queries when tuning an index"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(vectors.shape[0], min(count, vectors.shape[0]), replace=False)
+    sample = np.asarray(vectors[np.sort(rows)], dtype=np.float32)
+    return normalize_rows(sample + noise * rng.standard_normal(sample.shape).astype(np.float32))
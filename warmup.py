@@ -0,0 +1,98 @@
+"""Lazily loaded models and the background warm-up that loads them early.
+
+Importing the embedding model pulls in torch and sentence-transformers and
+loads its weights, which takes seconds. The app creates it on first use
+instead, so the server starts accepting requests (and /api/classes answers)
+right away, while a warm-up thread loads the models before the first
+question needs them.
+"""
+import threading
+import time
+
+
+class LazyEmbeddings:
+    """A Hugging Face sentence-transformers model, constructed on first use"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                from langchain_huggingface import HuggingFaceEmbeddings
+                self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+                self.load_seconds = time.perf_counter() - start
+                print(f"Loaded embedding model {self.model_name} in {self.load_seconds:.2f}s")
+        return self._model
+
+    def embed_documents(self, texts):
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.load().embed_query(text)
+
+
+class Warmup:
+    """Runs named warm-up steps once on a daemon thread and reports readiness.
+
+    `steps` is a list of (name, function, required); the server is ready
+    when every required step has succeeded. Optional steps (e.g. asking
+    Ollama to load its model) may fail without blocking readiness.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self._status = {name: {"status": "pending", "required": required} for name, _, required in steps}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._done = threading.Event()
+
+    def start(self):
+        """Start the warm-up thread if it has not been started yet"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+                self._thread.start()
+
+    def run(self):
+        for name, step, _ in self.steps:
+            self._set(name, status="loading")
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {e}")
+                self._set(name, status="failed", error=str(e), seconds=time.perf_counter() - start)
+            else:
+                self._set(name, status="ready", seconds=time.perf_counter() - start)
+        self._done.set()
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    @property
+    def ready(self):
+        with self._lock:
+            return all(step["status"] == "ready" for step in self._status.values() if step["required"])
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "started": self._thread is not None,
+                "finished": self._done.is_set(),
+                "steps": {name: dict(step) for name, step in self._status.items()},
+            }